@@ -14,8 +14,10 @@ from gmusicapi import Mobileclient
 from simpleconf import Section, Option
 from mmp.tracks import Track
 from mmp.app import media_dir
-from mmp.jobs import add_job
+from mmp.jobs import add_job, priority_ui
 from mmp.backends import Backend, DownloadStates
+from mmp.catalogue import catalogue
+from mmp.streams import open_url_stream
 from mmp.ui.panels.backend_panel import BackendPanel
 from mmp.hotkeys import add_hotkey, add_section
 
@@ -35,39 +37,37 @@ load_speed = 0.05
 
 
 class GooglePanel(BackendPanel):
+    remote_search = False
+
     def __init__(self, *args, **kwargs):
         super(GooglePanel, self).__init__(*args, **kwargs)
         self.processing_tracks = False
         self.tracks_data = None
         self.logger = logging.getLogger(self.backend.name + ' Playlist')
         self.Bind(wx.EVT_SHOW, self.on_show)
-        self.search_field.Disable()
 
-    def add_track(self):
-        if not self.tracks_data:
-            if self.tracks_data is not None:  # Empty list.
-                self.logger.info('Tracks loaded.')
-            self.tracks_data = None
+    def load_tracks(self):
+        """A job to turn self.tracks_data into tracks and show them all at
+        once."""
+        data, self.tracks_data = self.tracks_data, None
+        try:
+            tracks = [GoogleTrack.from_dict(d) for d in data]
+            self.logger.info('Loaded %d tracks.', len(tracks))
+            self.add_results(tracks)
+        finally:
             self.processing_tracks = False
-            return True  # Stop.
-        d = self.tracks_data.pop(0)
-        track = GoogleTrack.from_dict(d)
-        self.logger.info('Loading track %r.', track)
-        wx.CallAfter(self.add_result, track)
+        return True
 
     def on_show(self, event):
         """Start adding tracks."""
         event.Skip()
         if self.tracks_data and not self.processing_tracks:
-            self.processing = True
+            self.processing_tracks = True
             add_job(
-                'Load tracks for %s' % self.backend.name,
-                self.add_track, run_every=load_speed
+                'Load tracks for %s' % self.backend.name, self.load_tracks,
+                priority=priority_ui
             )
 
-    def do_search(self, event):
-        pass  # Do nothing.
-
 
 class PlaylistsPanel(SizedPanel):
     def __init__(self, backend, *args, **kwargs):
@@ -122,6 +122,13 @@ def build_playlists():
     )
     num_playlists = len(playlists_data)
     logger.info('Loaded playlists: %d.', num_playlists)
+    catalogue.add(
+        backend, [
+            GoogleTrack.from_dict(entry['track'])
+            for playlist in playlists_data
+            for entry in playlist.get('tracks', []) if 'track' in entry
+        ]
+    )
 
     def add_playlists():
         """Add playlists."""
@@ -131,7 +138,10 @@ def build_playlists():
         playlist = playlists_data.pop(0)
         wx.CallAfter(add_playlist, playlist)
 
-    add_job('Add Playlists', add_playlists, run_every=load_speed)
+    add_job(
+        'Add Playlists', add_playlists, run_every=load_speed, lane='realtime',
+        priority=priority_ui
+    )
     return True
 
 
@@ -175,6 +185,7 @@ def build_library():
     logger.info('Retrieving library.')
     l = api.get_all_songs()
     logger.info('Library tracks: %d.', len(l))
+    catalogue.add(backend, [GoogleTrack.from_dict(d) for d in l])
     library_backend.panel.tracks_data = l
     return True
 
@@ -187,6 +198,7 @@ def build_promoted_songs():
     logger.info('Retrieving promoted songs...')
     l = api.get_promoted_songs()
     logger.info('Promoted tracks: %d.', len(l))
+    catalogue.add(backend, [GoogleTrack.from_dict(d) for d in l])
     promoted_songs_backend.panel.tracks_data = l
     return True
 
@@ -208,7 +220,9 @@ def display_album(event):
     if id is None:
         return backend.frame.on_error('No album ID found.')
     add_job(
-        'Display the album for %r' % res, partial(load_album, id))
+        'Display the album for %r' % res, partial(load_album, id),
+        key=('album', id), kind='Load Album'
+    )
 
 
 # Loading job functions:
@@ -222,6 +236,7 @@ def load_album(id):
     tracks = []
     for datum in data:
         tracks.append(GoogleTrack.from_dict(datum))
+    catalogue.add(backend, tracks)
     backend.panel.add_results(tracks)
     return True
 
@@ -363,16 +378,22 @@ class GoogleTrack(GoogleTrackBase):
         name = '%s.mp3' % self.id
         state = backend.get_download_state(name)
         if state is DownloadStates.downloaded:
-            return FileStream(file=backend.get_full_path(name))
+            return FileStream(file=backend.use_file(name))
         else:
             url = api.get_stream_url(self.id)
             if state is DownloadStates.none:
-                add_job(
-                    'Download track %r' % self,
-                    lambda: backend.download_file(url, name)
-                )
+                return open_url_stream(backend, url, name)
             return URLStream(url.encode())
 
+    def get_download(self):
+        """Return the URL to download this track from."""
+        assert self.id is not None
+        return (backend, api.get_stream_url(self.id), '%s.mp3' % self.id)
+
+    def get_key(self):
+        """Tracks are catalogued by their ids."""
+        return self.id
+
     @classmethod
     def from_dict(cls, data):
         """Create a Track instance from a track dictionary from Google."""
@@ -409,7 +430,8 @@ class GoogleAlbum(GoogleTrackBase):
         """Load the contents of this album via the jobs framework.."""
         add_job(
             'Load album tracks for %s' % self.title,
-            partial(load_album, self.id)
+            partial(load_album, self.id), key=('album', self.id),
+            kind='Load Album'
         )
 
 
@@ -7,7 +7,10 @@ from requests import get
 from bs4 import BeautifulSoup
 from attr import attrs, attrib, Factory
 from sound_lib.stream import URLStream
+from mmp import aio
 from mmp.backends import BackendError
+from mmp.catalogue import catalogue
+from mmp.search_cache import search_cache
 from mmp.tracks import Track
 
 logger = logging.getLogger(__name__)
@@ -15,6 +18,8 @@ logger = logging.getLogger(__name__)
 name = 'Soma'
 description = 'Commercial-free, Listener-supported Radio.'
 backend = None
+search_ttl = 24 * 60 * 60  # The list of stations rarely changes.
+persist_searches = True
 base_url = "http://somafm.com"
 stream_url = 'http://somafm.com/play'
 
@@ -52,14 +57,34 @@ class SomaTrack(Track):
         )
         raise SomaError('No stream URL found.')
 
+    def get_key(self):
+        """Stations are catalogued by their URLs."""
+        return self.url
+
 
 def load_stations(event):
     """Called when the panel is shown and there are no results yet."""
-    if backend.panel.results.Count:
+    if len(backend.panel.index):
         return  # Don't parse again.
-    r = get(base_url)
+    aio.submit(get_stations(), callback=backend.panel.add_results)
+
+
+async def get_stations():
+    """Return a list of SomaTrack instances, from the search cache if
+    possible."""
+    results = await search_cache.lookup_async(backend, '')
+    if results is None:
+        results = await download_stations()
+        search_cache.put(backend, '', results)
+    catalogue.add(backend, results)
+    return results
+
+
+async def download_stations():
+    """Download the list of stations."""
+    r = await aio.get(base_url)
     if not r.ok:
-        raise BackendError('Error %d.' % r.statuscode)
+        raise BackendError('Error %d.' % r.status_code)
     s = BeautifulSoup(r.content, 'html.parser')
     results = []
     for station in s.findAll('li', {"class": "cbshort"}):
@@ -69,9 +94,9 @@ def load_stations(event):
                 url=station.find('a')['href'].rstrip('/')
             )
         )
-    backend.panel.add_results(results)
+    return results
 
 
 def on_init(backend):
-    backend.panel.search_field.Disable()
+    backend.panel.remote_search = False
     backend.panel.Bind(wx.EVT_SHOW, load_stations)
@@ -1,15 +1,16 @@
 """Allows you to stream from URLs."""
 
 import logging
+import wx
 from urllib.request import Request, urlopen
 from attr import attrs, attrib, Factory
 from bs4 import BeautifulSoup
-from requests import get
 from sound_lib.main import BassError
 from sound_lib.stream import URLStream
 from mmp.tracks import Track
-from mmp.jobs import add_job
-from mmp import sound
+from mmp.jobs import add_job, priority_ui
+from mmp import sound, aio
+from mmp.formatter import formatter
 
 logger = logging.getLogger(__name__)
 
@@ -50,23 +51,29 @@ def set_stream_title():
         title = content[metaint:].split("'".encode())[1].decode()
         if title != stream.title:
             stream.title = title
-            backend.panel.results.SetString(stream.index, stream.title)
+            formatter.forget(stream)
+            wx.CallAfter(backend.panel.results.Refresh)
 
 
 def on_init(backend):
-    add_job('Set Stream Title', set_stream_title, run_every=1.0)
+    add_job(
+        'Set Stream Title', set_stream_title, run_every=1.0,
+        priority=priority_ui
+    )
 
 
-def on_search(value):
+async def on_search(value):
     if '://' not in value:
         value = 'http://' + value
     results = []
     try:
-        s = URLStream(value.encode())
+        # Opening the stream blocks, so do it in the loop's executor.
+        s = await aio.loop.run_in_executor(None, URLStream, value.encode())
+        s.free()
         results.append(StreamerTrack(None, None, None, None, url=value))
     except BassError:
         # Probably a web page. Let's see what we can see.
-        r = get(value)
+        r = await aio.get(value)
         s = BeautifulSoup(r.content)
         for audio in s.find_all('audio'):
             for source in audio.find_all('source'):
@@ -15,11 +15,12 @@ from pyperclip import copy
 from pytube import YouTube
 from sound_lib.stream import FileStream, URLStream
 from attr import attrs, attrib, Factory
-from requests import get
 from bs4 import BeautifulSoup
+from mmp import aio
 from mmp.tracks import Track
-from mmp.jobs import add_job
 from mmp.backends import DownloadStates
+from mmp.catalogue import catalogue
+from mmp.streams import open_url_stream
 
 logger = logging.getLogger(__name__)
 extension = 'mp4'
@@ -42,10 +43,16 @@ class YoutubeTrack(Track):
 
     url = attrib(default=Factory(lambda: None))
 
+    def get_download(self):
+        """Find the URL and filename of the audio for this video."""
+        y = YouTube(self.url)
+        v = y.filter(extension=extension)[-1]
+        return (backend, v.url, '%s.%s' % (v.filename, extension))
+
     def get_stream(self):
         """Return a filestream representing this object."""
         try:
-            y = YouTube(self.url)
+            _, url, name = self.get_download()
         except Exception as e:
             logger.critical('Failed to get a Youtube object from %r.', self)
             if isinstance(e, AttributeError):
@@ -54,18 +61,17 @@ class YoutubeTrack(Track):
                     'Unable to play. Opening in your default web browser.'
                 )
             raise e
-        v = y.filter(extension=extension)[-1]
-        name = '%s.%s' % (v.filename, extension)
         state = backend.get_download_state(name)
         if state is DownloadStates.downloaded:
-            return FileStream(file=backend.get_full_path(name))
+            return FileStream(file=backend.use_file(name))
+        elif state is DownloadStates.none:
+            return open_url_stream(backend, url, name)
         else:
-            if state is DownloadStates.none:
-                add_job(
-                    'Download track %r' % self,
-                    lambda: backend.download_file(v.url, name)
-                )
-            return URLStream(v.url.encode())
+            return URLStream(url.encode())
+
+    def get_key(self):
+        """Videos and channels are catalogued by their URLs."""
+        return self.url
 
 
 class YoutubeChannel(YoutubeTrack):
@@ -79,8 +85,9 @@ class YoutubeChannel(YoutubeTrack):
 
     def activate(self):
         """Show channel videos."""
-        backend.panel.add_results(
-            get_results_from_url(self.url, artist=self.title)
+        aio.submit(
+            get_results_from_url(self.url, artist=self.title),
+            callback=backend.panel.add_results
         )
 
 
@@ -102,15 +109,15 @@ def on_init(backend):
     )
 
 
-def on_search(value):
+async def on_search(value):
     """Get a list of YoutubeTrack instances."""
-    return get_results_from_url(base_url.format(quote(value)))
+    return await get_results_from_url(base_url.format(quote(value)))
 
 
-def get_results_from_url(url, artist='Unknown Artist'):
+async def get_results_from_url(url, artist='Unknown Artist'):
     """Download url and parse videos. Youtube channels don't show an artist so
     you can provide one with the artist arument."""
-    r = get(url)
+    r = await aio.get(url)
     if not r.ok:
         raise ValueError('Error %d.' % r.status_code)  # Something went wrong.
     logger.info('URL: %s.', r.url)
@@ -137,4 +144,5 @@ def get_results_from_url(url, artist='Unknown Artist'):
             url=vid_url
         )
         videos.append(video)
+    catalogue.add(backend, videos)
     return videos
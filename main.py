@@ -9,6 +9,7 @@ from mmp.ui.main_frame import MainFrame
 from mmp.ui.lyrics_frame import LyricsFrame
 from mmp.config import config
 from mmp.db import session, Hotkey, Section
+from mmp.jobs import dump_stats
 
 parser.set_defaults(
     log_file=os.path.join(
@@ -24,6 +25,13 @@ parser.add_argument(
     help='Clear the database to restore defaults'
 )
 
+parser.add_argument(
+    '-j',
+    '--dump-jobs',
+    metavar='FILENAME',
+    help='Write job statistics to FILENAME as JSON when the program exits'
+)
+
 if __name__ == '__main__':
     args = parser.parse_args()
     logging.basicConfig(
@@ -46,3 +54,6 @@ if __name__ == '__main__':
     if not os.path.isdir(app.data_dir):
         os.makedirs(app.data_dir)
     config.write(indent=4)
+    if args.dump_jobs:
+        logging.info('Dumping job statistics to %s.', args.dump_jobs)
+        dump_stats(args.dump_jobs)
@@ -0,0 +1,125 @@
+"""An asyncio event loop which runs on its own thread.
+
+Backends may make on_search a coroutine function, in which case it is run here
+rather than as a job. If aiohttp is installed, any number of concurrent
+requests share this one thread. Otherwise requests are made in the loop's
+default executor."""
+
+import asyncio
+import logging
+from functools import partial
+from inspect import iscoroutinefunction
+from threading import Thread
+import wx
+from attr import attrs, attrib
+from requests import get as requests_get
+from . import app
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+loop = asyncio.new_event_loop()
+thread = None
+client = None  # An aiohttp.ClientSession, created on the loop.
+close_timeout = 5.0  # Seconds stop waits for the session to close.
+
+
+@attrs
+class Response:
+    """The parts of a response which backends use, so they do not need to care
+    whether aiohttp is installed."""
+
+    url = attrib()
+    status_code = attrib()
+    content = attrib()
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+
+def is_async(func):
+    """Return True if func should be run on the loop."""
+    return iscoroutinefunction(func)
+
+
+def start():
+    """Start the loop thread if it is not already running."""
+    global thread
+    if thread is None:
+        thread = Thread(target=loop.run_forever, name='asyncio', daemon=True)
+        thread.start()
+
+
+def stop():
+    """Close the aiohttp session, waiting up to close_timeout seconds, then
+    stop the loop."""
+    if thread is not None:
+        if client is not None:
+            future = asyncio.run_coroutine_threadsafe(close_client(), loop)
+            try:
+                future.result(close_timeout)
+            except Exception as e:
+                logger.warning('Unable to close the aiohttp session:')
+                logger.exception(e)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def submit(coro, callback=None, errback=None):
+    """Run coro on the loop, returning a concurrent.futures.Future. If
+    callback is not None it is called with the result on the wx main thread.
+    Exceptions are passed to errback (or app.frame.on_error) in the same
+    way."""
+    start()
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def done(future):
+        if future.cancelled():
+            return
+        e = future.exception()
+        if e is None:
+            if callback is not None:
+                wx.CallAfter(callback, future.result())
+        else:
+            logger.exception(e, exc_info=e)
+            if errback is None:
+                wx.CallAfter(app.frame.on_error, e)
+            else:
+                wx.CallAfter(errback, e)
+
+    future.add_done_callback(done)
+    return future
+
+
+async def get_client():
+    """Return the shared aiohttp session."""
+    global client
+    if client is None:
+        client = aiohttp.ClientSession()
+    return client
+
+
+async def close_client():
+    """Close the shared aiohttp session, if there is one."""
+    global client
+    if client is not None:
+        session, client = client, None
+        await session.close()
+
+
+async def get(url, **kwargs):
+    """Get url, returning a Response instance. All extra kwargs are passed
+    onto aiohttp or requests."""
+    if aiohttp is None:
+        r = await loop.run_in_executor(
+            None, partial(requests_get, url, **kwargs)
+        )
+        return Response(r.url, r.status_code, r.content)
+    session = await get_client()
+    async with session.get(url, **kwargs) as r:
+        content = await r.read()
+        return Response(str(r.url), r.status, content)
+
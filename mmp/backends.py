@@ -3,24 +3,21 @@
 import logging
 import os
 import os.path
-from enum import Enum
-from datetime import datetime
-from requests import get
+from asyncio import wrap_future
+from functools import partial
+from time import time
 from attr import attrs, attrib, Factory
 from simpleconf import Section
 from . import app
+from .downloads import get_partial_path, fetch_to_file, manager
 from .jobs import add_job
 from .ui.panels.backend_panel import BackendPanel
 from .config import config
-from .db import session, File
+from .cache import cache, DownloadStates
+from .search_cache import search_cache
 
 logger = logging.getLogger(__name__)
-
-
-class DownloadStates(Enum):
-    none = 0
-    downloading = 1
-    downloaded = 2
+progress_interval = 1.0  # How often to record download progress.
 
 
 class DownloadError(Exception):
@@ -56,6 +53,10 @@ class Backend:
     on_search = attrib()
     panel = attrib()
     root = attrib(default=Factory(lambda: None))
+    cache_size = attrib(default=Factory(lambda: None))
+    search_timeout = attrib(default=Factory(lambda: None))
+    search_ttl = attrib(default=Factory(lambda: None))
+    persist_searches = attrib(default=Factory(bool))
     node = attrib(default=Factory(lambda: None), init=False)
     module = attrib(default=Factory(lambda: None), init=False)
 
@@ -68,6 +69,7 @@ class Backend:
             self.frame.add_config(self.frame.backends_config_root, self.config)
         if self.root is None:
             self.root = self.frame.backends_root
+        cache.set_budget(self.short_name, self.cache_size)
         self.panel = self.panel(self, self.frame.splitter)
         self.panel.Hide()
         if self.loop_func is not None:
@@ -86,8 +88,14 @@ class Backend:
                 getattr(module, 'loop_func', None),
                 getattr(module, 'config', None),
                 getattr(module, 'on_search', frame.on_error),
-                getattr(module, 'BackendPanel', BackendPanel)
+                getattr(module, 'BackendPanel', BackendPanel),
+                cache_size=getattr(module, 'cache_size', None),
+                search_timeout=getattr(module, 'search_timeout', None),
+                search_ttl=getattr(module, 'search_ttl', None),
+                persist_searches=getattr(module, 'persist_searches', False)
             )
+            if hasattr(module, 'on_search'):
+                b.on_search = search_cache.wrap(b, b.on_search)
             module.backend = b
             return b
         else:
@@ -95,6 +103,20 @@ class Backend:
                 'The backend loaded from %r has no name.' % module
             )
 
+    def get_search_timeout(self):
+        """Return how many seconds a global search should wait for this
+        backend."""
+        if self.search_timeout is None:
+            return config.interface['search_timeout']
+        return self.search_timeout
+
+    def get_search_ttl(self):
+        """Return how many seconds the results of searching this backend
+        should be remembered for."""
+        if self.search_ttl is None:
+            return config.interface['search_cache_time']
+        return self.search_ttl
+
     def get_download_path(self):
         """Returns the path which should be used for file storage by this
         backend."""
@@ -109,72 +131,120 @@ class Backend:
 
     def register_file(self, path):
         """Register a file as present on the system."""
-        with session() as s:
-            q = s.query(File).filter_by(path=path)
-            if q.count():
-                f = q.first()
-            else:
-                f = File(path=path)
-            f.downloaded = datetime.utcnow()
-            s.add(f)
-            c = s.query(File).count()
-            if c > config.files['max_files']:
-                l = c - config.files['max_files']
-                logger.info(
-                    'Deleting %d old %s.', l, 'file' if l == 1 else 'files'
-                )
-                for old in s.query(File).order_by(File.downloaded).limit(l):
-                    logger.info('Deleting file %r.', old)
-                    if os.path.exists(old.path):
-                        try:
-                            os.remove(old.path)
-                        except OSError as e:
-                            logger.warning('Unable to delete %s:', old.path)
-                            logger.exception(e)
-                    s.delete(old)
-            return f.id
+        cache.finish(path, self.short_name)
 
     def get_download_state(self, name):
         """Get the state of a file. The value returned will be one of the
         members of DownloadStates."""
-        with session() as s:
-            q = s.query(File).filter_by(
-                path=os.path.join(self.get_download_path(), name)
-            ).first()
-            if q is None:
-                return DownloadStates.none
-            elif q.downloaded is None:
-                return DownloadStates.downloading
-            else:
-                return DownloadStates.downloaded
-
-    def download_file(self, url, name, overwrite=False, **kwargs):
+        return cache.get_state(self.get_full_path(name))
+
+    def use_file(self, name):
+        """Return the full path to the downloaded file called name, and record
+        that it has been played, so it is the last to be evicted from the
+        cache."""
+        path = self.get_full_path(name)
+        cache.touch(path)
+        return path
+
+    def start_download(self, name):
+        """Mark the file called name as downloading and return its full path.
+        Raises AlreadyDownloadingError if it is already downloading."""
+        if self.get_download_state(name) is DownloadStates.downloading:
+            raise AlreadyDownloadingError()
+        path = self.get_full_path(name)
+        cache.start(path, self.short_name)
+        return path
+
+    def finish_download(self, path):
+        """Move the partial download of path into place and mark it as
+        downloaded."""
+        os.replace(get_partial_path(path), path)
+        cache.finish(path, self.short_name)
+
+    def abandon_download(self, path):
+        """Forget that path was downloading. The partial file is left where it
+        is, so the download can be resumed."""
+        cache.forget(path)
+
+    def set_progress(self, path, progress):
+        """Record that progress bytes of path have been downloaded."""
+        cache.set_progress(path, progress)
+
+    def progress_recorder(self, path, callback=None):
+        """Return a function to pass as the progress argument of
+        mmp.downloads.fetch_to_file, which calls self.set_progress at most
+        once every progress_interval seconds. If callback is not None it is
+        called with every position as well."""
+        last_update = time()
+
+        def progress(position, total=None):
+            nonlocal last_update
+            if callback is not None:
+                callback(position, total)
+            now = time()
+            if now - last_update >= progress_interval:
+                last_update = now
+                self.set_progress(path, position)
+
+        return progress
+
+    def fetch_file(self, url, name, progress, **kwargs):
+        """Download url as the file called name, reporting progress to
+        progress. This is called by the download manager, so use
+        download_file instead."""
+        path = self.start_download(name)
+        logger.info('Downloading %s to %s.', url, path)
+        try:
+            status = fetch_to_file(
+                url, get_partial_path(path),
+                progress=self.progress_recorder(path, callback=progress),
+                **kwargs
+            )
+            if status >= 400:
+                raise DownloadFailedError(status)
+        except Exception:
+            self.abandon_download(path)
+            raise
+        self.finish_download(path)
+        return path
+
+    def submit_download(self, url, name, progress=None, **kwargs):
+        """Give the download of url as the file called name to
+        mmp.downloads.manager, returning a concurrent.futures.Future which
+        will be set to the full path."""
+        return manager.submit(
+            url, self.get_full_path(name),
+            partial(self.fetch_file, url, name, **kwargs), progress=progress
+        )
+
+    def download_file(
+        self, url, name, overwrite=False, progress=None, **kwargs
+    ):
         """Download the given URL to the specified filename and register the
         file. This method will block. If overwrite evaluates to True and the
         path already exists, this method does nothing except return the full
         path. Otherwise the file is overwritten if necessary before the path is
-        returned. All extra kwargs are passed onto requests.get."""
+        returned. If progress is not None it is called with the number of
+        bytes downloaded and the full size (or None) after each chunk, and may
+        raise an exception to stop the download. All extra kwargs are passed
+        onto requests.get.
+
+        The file is streamed to a partial file, which is renamed once it is
+        complete. If a partial file is already there the download is resumed
+        from the end of it. If the file is already being downloaded by the
+        download manager, this waits for that download instead, and progress
+        is not used."""
+        path = self.get_full_path(name)
+        if not os.path.isfile(path) or overwrite:
+            self.submit_download(
+                url, name, progress=progress, **kwargs
+            ).result()
+        return path
+
+    async def download_file_async(self, url, name, overwrite=False, **kwargs):
+        """The same as download_file, but to be awaited on the asyncio loop
+        (see mmp.aio) rather than blocking a thread."""
         path = self.get_full_path(name)
         if not os.path.isfile(path) or overwrite:
-            if self.get_download_state(name) is DownloadStates.downloading:
-                raise AlreadyDownloadingError()
-            with session() as s:
-                f = s.query(File).filter_by(path=path).first()
-                if f is None:
-                    f = File(path=path)
-                f.downloaded = None
-                s.add(f)
-                s.commit()
-                logger.info('Downloading %s to %s.', url, f.path)
-                r = get(url, **kwargs)
-                if not r.ok:
-                    raise DownloadFailedError(r.status_code)
-                if r.content.__class__ is bytes:
-                    flags = 'wb'
-                else:
-                    flags = 'w'
-                with open(path, flags) as fp:
-                    fp.write(r.content)
-                f.downloaded = datetime.now()
-                s.add(f)
+            await wrap_future(self.submit_download(url, name, **kwargs))
         return path
@@ -0,0 +1,365 @@
+"""The media cache.
+
+Every file which has been downloaded, or is being downloaded, has a row in the
+files table. The cache keeps an index of those rows in memory, so checking
+whether a track is available never touches the database, and deletes the least
+recently played files whenever the cache grows past its budget. Each backend
+stores its files in its own partition, which may have a budget of its own."""
+
+import logging
+import os
+import os.path
+from datetime import datetime
+from enum import Enum
+from threading import RLock
+from time import time
+from attr import attrs, attrib, Factory
+from sound_lib.stream import FileStream
+from . import app, sound
+from .config import config
+from .db import session, File
+from .downloads import partial_extension
+from .jobs import add_job, priority_download
+
+logger = logging.getLogger(__name__)
+megabyte = 1024 * 1024
+save_delay = 5.0  # How long to wait before writing access times.
+partial_max_age = 7 * 24 * 60 * 60  # Seconds to keep unclaimed partials.
+chunk_size = 500  # Keeps queries under SQLite's limit on parameters.
+
+
+class DownloadStates(Enum):
+    none = 0
+    downloading = 1
+    downloaded = 2
+
+
+def chunks(items):
+    """Yield lists of at most chunk_size items from items."""
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
+
+
+def get_open_paths():
+    """Return the set of paths of the files which sound has open, so they
+    aren't deleted while they are playing, fading out or waiting to play
+    next."""
+    paths = set()
+    for playing in (sound.old_stream, sound.new_stream, sound.next_stream):
+        if playing is not None and isinstance(playing.stream, FileStream):
+            paths.add(os.fsdecode(playing.stream.file))
+    return paths
+
+
+def scan_partitions(partitions):
+    """Return a tuple of (files, partials), dictionaries mapping the paths of
+    the complete and partial files in the directories of partitions to their
+    os.stat results."""
+    files = {}
+    partials = {}
+    for partition in partitions:
+        directory = os.path.join(app.media_dir, partition)
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(partial_extension):
+                partials[entry.path] = entry.stat()
+            else:
+                files[entry.path] = entry.stat()
+    return (files, partials)
+
+
+@attrs
+class CacheEntry:
+    """A file in the cache. While the file is downloading size is the number of
+    bytes downloaded so far."""
+
+    path = attrib()
+    partition = attrib()
+    state = attrib()
+    size = attrib(default=Factory(int))
+    last_access = attrib(default=Factory(datetime.utcnow))
+    dirty = attrib(default=Factory(bool), init=False)
+
+
+@attrs
+class MediaCache:
+    """An index of the files table, keyed by path."""
+
+    entries = attrib(default=Factory(dict), init=False)
+    budgets = attrib(default=Factory(dict), init=False)  # Partition budgets.
+    partitions = attrib(default=Factory(set), init=False)
+    lock = attrib(default=Factory(RLock), init=False)
+    loaded = attrib(default=Factory(bool), init=False)
+
+    def load(self):
+        """Read the files table and reconcile it with the partition
+        directories, unless that has already been done. Everything is written
+        in one transaction. Returns True, so this can be used as a job.
+
+        Nothing can be downloading before the index has loaded, so rows which
+        are still marked as downloading were left by a crash. If the complete
+        file is there they are marked as downloaded, otherwise they are
+        deleted. Their partial files are kept, so they can be resumed, unless
+        they are older than partial_max_age or the complete file is there. Rows whose
+        files have gone are deleted, and files which are in a partition
+        directory but not in the table are added."""
+        with self.lock:
+            if self.loaded:
+                return True
+            started = time()
+            with session() as s:
+                rows = s.query(File).all()
+                for f in rows:
+                    if f.partition is None:
+                        f.partition = os.path.basename(os.path.dirname(f.path))
+                    self.partitions.add(f.partition)
+                files, partials = scan_partitions(self.partitions)
+                stale = []
+                for f in rows:
+                    stat = files.pop(f.path, None)
+                    if stat is None:
+                        stale.append(f.id)
+                        continue
+                    if f.downloaded is None:
+                        # The download finished, but the crash came before
+                        # it was recorded.
+                        f.downloaded = datetime.utcfromtimestamp(
+                            stat.st_mtime
+                        )
+                        f.progress = stat.st_size
+                    if f.size != stat.st_size:
+                        f.size = stat.st_size
+                    self.entries[f.path] = CacheEntry(
+                        f.path, f.partition, DownloadStates.downloaded,
+                        size=f.size, last_access=f.last_access or f.downloaded
+                    )
+                for chunk in chunks(stale):
+                    s.query(File).filter(File.id.in_(chunk)).delete(
+                        synchronize_session=False
+                    )
+                new = []
+                for path, stat in files.items():
+                    partition = os.path.basename(os.path.dirname(path))
+                    when = datetime.utcfromtimestamp(stat.st_mtime)
+                    new.append(
+                        dict(
+                            path=path, partition=partition, downloaded=when,
+                            last_access=when, size=stat.st_size,
+                            progress=stat.st_size
+                        )
+                    )
+                    self.entries[path] = CacheEntry(
+                        path, partition, DownloadStates.downloaded,
+                        size=stat.st_size, last_access=when
+                    )
+                if new:
+                    s.bulk_insert_mappings(File, new)
+            removed = 0
+            for path, stat in partials.items():
+                if path[:-len(partial_extension)] in self.entries or \
+                   started - stat.st_mtime > partial_max_age:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError as e:
+                        logger.warning('Unable to delete %s:', path)
+                        logger.exception(e)
+            self.loaded = True
+            logger.info(
+                'Loaded %d cache entries in %.2f seconds. Forgot %d, added '
+                '%d, deleted %d of %d partial files.', len(self.entries),
+                time() - started, len(stale), len(new), removed, len(partials)
+            )
+        self.schedule_eviction()
+        return True
+
+    def get(self, path):
+        """Return the CacheEntry for path, or None."""
+        self.load()
+        with self.lock:
+            return self.entries.get(path)
+
+    def get_state(self, path):
+        """Return the DownloadStates member for path."""
+        entry = self.get(path)
+        if entry is None:
+            return DownloadStates.none
+        return entry.state
+
+    def set_budget(self, partition, size):
+        """Add partition, limiting it to size megabytes. If size is None the
+        partition is only limited by the size of the cache as a whole."""
+        with self.lock:
+            self.partitions.add(partition)
+            if size is None:
+                self.budgets.pop(partition, None)
+            else:
+                self.budgets[partition] = size * megabyte
+
+    def start(self, path, partition):
+        """Record that path is downloading."""
+        self.load()
+        with self.lock:
+            self.entries[path] = CacheEntry(
+                path, partition, DownloadStates.downloading
+            )
+        with session() as s:
+            f = s.query(File).filter_by(path=path).first()
+            if f is None:
+                f = File(path=path)
+            f.partition = partition
+            f.downloaded = None
+            f.progress = 0
+            f.size = None
+            s.add(f)
+
+    def finish(self, path, partition):
+        """Record that path has been downloaded, then evict anything which no
+        longer fits."""
+        self.load()
+        now = datetime.utcnow()
+        size = os.path.getsize(path)
+        with self.lock:
+            self.entries[path] = CacheEntry(
+                path, partition, DownloadStates.downloaded, size=size,
+                last_access=now
+            )
+        with session() as s:
+            f = s.query(File).filter_by(path=path).first()
+            if f is None:
+                f = File(path=path)
+            f.partition = partition
+            f.downloaded = now
+            f.last_access = now
+            f.progress = size
+            f.size = size
+            s.add(f)
+        self.schedule_eviction()
+
+    def forget(self, path):
+        """Remove path from the cache, leaving any file where it is."""
+        self.load()
+        with self.lock:
+            self.entries.pop(path, None)
+        with session() as s:
+            s.query(File).filter_by(path=path).delete()
+
+    def set_progress(self, path, progress):
+        """Record that progress bytes of path have been downloaded."""
+        entry = self.get(path)
+        if entry is not None:
+            entry.size = progress
+        with session() as s:
+            s.query(File).filter_by(path=path).update({'progress': progress})
+
+    def touch(self, path):
+        """Record that path has just been played. The time is written to the
+        database a little later, so playing a track costs no queries."""
+        entry = self.get(path)
+        if entry is None:
+            return
+        with self.lock:
+            entry.last_access = datetime.utcnow()
+            entry.dirty = True
+        add_job(
+            'Save Cache Index', self.save, priority=priority_download,
+            key='save cache index', delay=save_delay
+        )
+
+    def save(self):
+        """A job to write any changed access times to the database in one
+        transaction."""
+        with self.lock:
+            dirty = [e for e in self.entries.values() if e.dirty]
+            for entry in dirty:
+                entry.dirty = False
+        if dirty:
+            with session() as s:
+                for entry in dirty:
+                    s.query(File).filter_by(path=entry.path).update(
+                        {'last_access': entry.last_access}
+                    )
+        return True
+
+    def schedule_eviction(self):
+        """Evict files in the background."""
+        add_job(
+            'Evict Cache', self.evict, priority=priority_download,
+            key='evict cache'
+        )
+
+    def get_victims(self):
+        """Return the downloaded entries which should be evicted, least
+        recently played first. The most recently played file, and any which
+        are open (see get_open_paths), are always kept."""
+        budget = config.files['cache_size'] * megabyte
+        open_paths = get_open_paths()
+        with self.lock:
+            downloaded = sorted(
+                (
+                    e for e in self.entries.values()
+                    if e.state is DownloadStates.downloaded
+                ), key=lambda e: e.last_access
+            )[:-1]
+            downloaded = [e for e in downloaded if e.path not in open_paths]
+            totals = {}
+            for entry in self.entries.values():
+                totals[entry.partition] = totals.get(
+                    entry.partition, 0
+                ) + entry.size
+            total = sum(totals.values())
+            victims = []
+            for entry in downloaded:
+                partition_budget = self.budgets.get(entry.partition)
+                if (budget and total > budget) or (
+                    partition_budget is not None and
+                    totals[entry.partition] > partition_budget
+                ):
+                    victims.append(entry)
+                    total -= entry.size
+                    totals[entry.partition] -= entry.size
+            return victims
+
+    def evict(self):
+        """A job to delete the least recently played files until the cache and
+        each of its partitions fit within their budgets. Files which can't be
+        deleted stay in the index, so they can be tried again next time."""
+        victims = self.get_victims()
+        if not victims:
+            return True
+        logger.info(
+            'Evicting %d %s (%d bytes).', len(victims),
+            'file' if len(victims) == 1 else 'files',
+            sum(e.size for e in victims)
+        )
+        deleted = []
+        for entry in victims:
+            logger.info('Deleting file %s.', entry.path)
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning('Unable to delete %s:', entry.path)
+                logger.exception(e)
+                continue
+            deleted.append(entry)
+        forgotten = []
+        with self.lock:
+            for entry in deleted:
+                # The file may have started downloading again since.
+                if self.entries.get(entry.path) is entry:
+                    del self.entries[entry.path]
+                    forgotten.append(entry.path)
+        with session() as s:
+            for chunk in chunks(forgotten):
+                s.query(File).filter(File.path.in_(chunk)).delete(
+                    synchronize_session=False
+                )
+        return True
+
+
+cache = MediaCache()
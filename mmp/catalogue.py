@@ -0,0 +1,115 @@
+"""The track catalogue.
+
+Every track which a backend loads is recorded in the catalogue table, so it
+can be found by Catalogue.search without the network, even after a restart.
+Backends pass the tracks they load to catalogue.add, and they are written in
+the background, in one transaction however many there are."""
+
+import logging
+import pickle
+from datetime import datetime
+from threading import Lock
+from time import time
+from attr import attrs, attrib, Factory
+from sqlalchemy import text, bindparam, DateTime, LargeBinary
+from .db import session
+from .jobs import add_job, priority_download
+from .track_index import tokenise
+
+logger = logging.getLogger(__name__)
+save_delay = 1.0  # How long to wait for more tracks before saving.
+max_results = 200
+
+# Tracks which are already in the catalogue are updated rather than added
+# twice, so their rows and full-text entries keep their ids.
+upsert = text(
+    'INSERT INTO catalogue (backend, "key", artist, album, title, seen, '
+    'data) VALUES (:backend, :key, :artist, :album, :title, :seen, :data) '
+    'ON CONFLICT (backend, "key") DO UPDATE SET artist = excluded.artist, '
+    'album = excluded.album, title = excluded.title, seen = excluded.seen, '
+    'data = excluded.data'
+).bindparams(
+    bindparam('seen', type_=DateTime), bindparam('data', type_=LargeBinary)
+)
+select = text(
+    'SELECT catalogue.backend, catalogue.data FROM catalogue_fts JOIN '
+    'catalogue ON catalogue.id = catalogue_fts.rowid WHERE catalogue_fts '
+    'MATCH :match ORDER BY rank LIMIT :limit'
+)
+
+
+def get_match(query):
+    """Return an FTS5 query which matches the tracks with a word starting with
+    each word of query, or None if query has no words."""
+    words = tokenise(query)
+    if words:
+        return ' '.join('"%s"*' % word for word in words)
+
+
+@attrs
+class Catalogue:
+    """Queues tracks to be saved, and searches those which have been."""
+
+    pending = attrib(default=Factory(list), init=False)  # (name, track)
+    lock = attrib(default=Factory(Lock), init=False)
+
+    def add(self, backend, tracks):
+        """Record that tracks were loaded by backend. Tracks whose get_key
+        method returns None are ignored."""
+        with self.lock:
+            self.pending.extend((backend.short_name, t) for t in tracks)
+        add_job(
+            'Save Catalogue', self.save, priority=priority_download,
+            key='save catalogue', delay=save_delay
+        )
+
+    def save(self):
+        """A job to write the queued tracks to the database."""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        started = time()
+        now = datetime.utcnow()
+        rows = {}
+        for name, track in pending:
+            key = track.get_key()
+            if key is None:
+                continue
+            try:
+                data = pickle.dumps(track)
+            except Exception as e:
+                logger.warning('Unable to catalogue %r:', track)
+                logger.exception(e)
+                continue
+            rows[(name, key)] = dict(
+                backend=name, key=str(key), artist=track.artist,
+                album=track.album, title=track.title, seen=now, data=data
+            )
+        if rows:
+            with session() as s:
+                s.execute(upsert, list(rows.values()))
+            logger.info(
+                'Catalogued %d tracks in %.2f seconds.', len(rows),
+                time() - started
+            )
+        return True
+
+    def search(self, query, limit=max_results):
+        """Return a list of (backend short name, track) pairs for the
+        catalogued tracks which match query, best first. This blocks, so call
+        it from a job."""
+        match = get_match(query)
+        if match is None:
+            return []
+        with session() as s:
+            rows = s.execute(select, dict(match=match, limit=limit)).fetchall()
+        results = []
+        for name, data in rows:
+            try:
+                results.append((name, pickle.loads(data)))
+            except Exception as e:
+                logger.warning('Unable to load a track from %s:', name)
+                logger.exception(e)
+        return results
+
+
+catalogue = Catalogue()
@@ -6,6 +6,8 @@ from jinja2.exceptions import TemplateError
 from simpleconf import Section, Option
 from simpleconf.validators import Integer, Float
 from . import app
+from .formatter import formatter
+from .templates import environment
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +16,7 @@ class TrackFormatOption(Option):
     def set(self, value):
         super(TrackFormatOption, self).set(value)
         try:
-            app.track_format_template = app.environment.from_string(value)
+            formatter.set_format(value)
         except TemplateError as e:
             logger.warning(
                 'Template error:\nOption: %r\nFormat: %r', self, value
@@ -27,7 +29,7 @@ class TitleFormatOption(Option):
     def set(self, value):
         super(TitleFormatOption, self).set(value)
         try:
-            app.title_template = app.environment.from_string(value)
+            app.title_template = environment.from_string(value)
         except TemplateError as e:
             logger.warning(
                 'Template error:\nOption: %r\nFormat: %r', self, value
@@ -71,14 +73,24 @@ class Config(Section):
             '{% endif %}]', title='The format for the window title'
         )
         last_backend = Option('', title='The last &Backend to be viewed')
-        option_order = (track_format, title_format)
+        search_timeout = Option(
+            10, title='Seconds to wait for each backend when &searching all '
+            'backends', validator=Integer(min=1)
+        )
+        search_cache_time = Option(
+            300, title='Seconds to &remember search results for (0 to not '
+            'remember them)', validator=Integer(min=0)
+        )
+        option_order = (
+            track_format, title_format, search_timeout, search_cache_time
+        )
 
     class sound(Section):
         title = 'Sound'
 
         volume = Option(100, validator=Integer(min=0, max=100))
         crossfade_amount = Option(
-            0, title='The time to spend crossfading between songs',
+            0, title='&Seconds to spend crossfading between songs',
             validator=Integer(min=0)
         )
         volume_base = Option(
@@ -93,17 +105,37 @@ class Config(Section):
             500000, title='&How far into a track the previous command jumps '
             'back to the beginning', validator=Integer
         )
+        preload_time = Option(
+            10, title='Seconds before the end of a track to start &loading '
+            'the next one', validator=Integer(min=0)
+        )
+        shuffle = Option(
+            False, title='S&huffle the tracks queued from a list of results'
+        )
         option_order = [
-            crossfade_amount, volume_base, volume_adjust, previous_threshold
+            crossfade_amount, volume_base, volume_adjust, previous_threshold,
+            preload_time, shuffle
         ]
 
     class files(Section):
         """File management."""
 
         title = 'Files'
-        max_files = Option(100, title='Files to &Keep', validator=Integer)
+        cache_size = Option(
+            2048, title='Maximum size of the media &cache in megabytes (0 '
+            'for no limit)', validator=Integer(min=0)
+        )
+
+        prefetch_tracks = Option(
+            3, title='Number of queued tracks to &download ahead',
+            validator=Integer(min=0)
+        )
+        prefetch_rate = Option(
+            0, title='Maximum speed for downloading ahead in &kilobytes per '
+            'second (0 for no limit)', validator=Integer(min=0)
+        )
 
-        option_order = [max_files]
+        option_order = [cache_size, prefetch_tracks, prefetch_rate]
 
     class backends (Section):
         title = 'Backends'
@@ -1,17 +1,19 @@
 """The database portion of the client."""
 
 from .base import Base
-from .session import Session, session
+from .session import Session, session, bulk
 from .hotkeys import Section, Hotkey
 from .proxy import DBProxy
 from .files import File
+from .searches import Search
+from .catalogue import CatalogueEntry
+from .migrations import upgrade
 
-Base.metadata.create_all()
-with session() as s:
-    s.query(Section).delete()  # Clear sections.
-    s.query(Hotkey).update({'active': False})
+
+upgrade()
 
 
 __all__ = [
-    'Base', 'Session', 'session', 'Hotkey', 'Section', 'DBProxy', 'File'
+    'Base', 'Session', 'session', 'bulk', 'Hotkey', 'Section', 'DBProxy',
+    'File', 'Search', 'CatalogueEntry'
 ]
@@ -0,0 +1,47 @@
+"""Every track which has been loaded by a backend."""
+
+from sqlalchemy import (
+    Column, String, DateTime, LargeBinary, Index, DDL, event
+)
+from attrs_sqlalchemy import attrs_sqlalchemy
+from .base import Base
+
+# The full-text index of the catalogue, which triggers keep up to date. These
+# are run when the catalogue table is created, and by the migration which
+# added it.
+fts_statements = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS catalogue_fts USING fts5(artist, '
+    "album, title, content='catalogue', content_rowid='id', prefix='2 3')",
+    'CREATE TRIGGER IF NOT EXISTS catalogue_ai AFTER INSERT ON catalogue '
+    'BEGIN INSERT INTO catalogue_fts (rowid, artist, album, title) VALUES '
+    '(new.id, new.artist, new.album, new.title); END',
+    'CREATE TRIGGER IF NOT EXISTS catalogue_ad AFTER DELETE ON catalogue '
+    'BEGIN INSERT INTO catalogue_fts (catalogue_fts, rowid, artist, album, '
+    "title) VALUES ('delete', old.id, old.artist, old.album, old.title); END",
+    'CREATE TRIGGER IF NOT EXISTS catalogue_au AFTER UPDATE OF artist, '
+    'album, title ON catalogue BEGIN INSERT INTO catalogue_fts '
+    "(catalogue_fts, rowid, artist, album, title) VALUES ('delete', old.id, "
+    'old.artist, old.album, old.title); INSERT INTO catalogue_fts (rowid, '
+    'artist, album, title) VALUES (new.id, new.artist, new.album, '
+    'new.title); END'
+)
+
+
+@attrs_sqlalchemy
+class CatalogueEntry(Base):
+    """A pickled track, with the fields which are searched."""
+    __tablename__ = 'catalogue'
+    __table_args__ = (
+        Index('ix_catalogue_backend_key', 'backend', 'key', unique=True),
+    )
+    backend = Column(String(100), nullable=False)  # Backend short name.
+    key = Column(String(500), nullable=False)  # From Track.get_key.
+    artist = Column(String(500), nullable=True)
+    album = Column(String(500), nullable=True)
+    title = Column(String(500), nullable=True)
+    seen = Column(DateTime(timezone=True), nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+
+for statement in fts_statements:
+    event.listen(CatalogueEntry.__table__, 'after_create', DDL(statement))
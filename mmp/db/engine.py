@@ -1,7 +1,29 @@
 """The database engine."""
 
 import os.path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
 from ..app import data_dir
 
-engine = create_engine('sqlite:///%s' % os.path.join(data_dir, 'db.sqlite3'))
+busy_timeout = 10  # Seconds to wait for another connection to finish writing.
+pool_size = 5
+
+# The UI thread and the job threads all use the database, so connections are
+# pooled and shared between threads rather than opened for every session.
+engine = create_engine(
+    'sqlite:///%s' % os.path.join(data_dir, 'db.sqlite3'),
+    poolclass=QueuePool, pool_size=pool_size,
+    connect_args=dict(timeout=busy_timeout, check_same_thread=False)
+)
+
+
+@event.listens_for(engine, 'connect')
+def on_connect(connection, record):
+    """Configure each new connection. In WAL mode readers do not block the
+    writer or each other, and synchronous=NORMAL is safe with WAL, so commits
+    don't have to wait for the disk."""
+    cursor = connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=%d' % (busy_timeout * 1000))
+    cursor.close()
@@ -1,6 +1,6 @@
 """Files which have been downloaded by the client."""
 
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Integer
 from attrs_sqlalchemy import attrs_sqlalchemy
 from .base import Base
 
@@ -9,5 +9,9 @@ from .base import Base
 class File(Base):
     """A file object."""
     __tablename__ = 'files'
-    path = Column(String(500), nullable=False)
-    downloaded = Column(DateTime(timezone=True), nullable=True)
+    path = Column(String(500), nullable=False, index=True)
+    downloaded = Column(DateTime(timezone=True), nullable=True, index=True)
+    progress = Column(Integer, nullable=True)  # Bytes downloaded so far.
+    size = Column(Integer, nullable=True)
+    last_access = Column(DateTime(timezone=True), nullable=True)
+    partition = Column(String(100), nullable=True)  # Backend short name.
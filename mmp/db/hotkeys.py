@@ -1,6 +1,6 @@
 """Provides the Hotkey and Section classes."""
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from attrs_sqlalchemy import attrs_sqlalchemy
 from .base import Base
@@ -24,6 +24,7 @@ class Section(Base):
 class Hotkey(Base):
     """A hotkey definition."""
     __tablename__ = 'hotkeys'
+    __table_args__ = (Index('ix_hotkeys_key_modifiers', 'key', 'modifiers'),)
     key = Column(Integer, nullable=True)
     default_key = Column(Integer, nullable=False)
     modifiers = Column(Integer, nullable=True)
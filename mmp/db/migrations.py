@@ -0,0 +1,182 @@
+"""Schema migrations.
+
+The schema version is kept in SQLite's user_version pragma. Each migration
+brings the schema up from the version before it, and is run in a transaction
+along with the change to user_version, so a failed migration leaves the
+database as it was. When the database is already current, checking costs a
+single pragma.
+
+Migrations must work on databases which were created or altered by older
+versions of this program before migrations existed, so they check for columns
+and use IF NOT EXISTS. To change the schema, change the models, then append a
+migration which makes the same change to existing databases."""
+
+import logging
+from .base import Base
+from .catalogue import fts_statements
+from .engine import engine
+
+logger = logging.getLogger(__name__)
+migrations = []
+
+
+def migration(func):
+    """Decorate a function as the next migration. It will be called with a
+    sqlite3 cursor."""
+    migrations.append(func)
+    return func
+
+
+def get_columns(cursor, table):
+    """Return the names of the columns in table."""
+    cursor.execute('PRAGMA table_info(%s)' % table)
+    return {row[1] for row in cursor.fetchall()}
+
+
+def add_column(cursor, table, column, type):
+    """Add a column to table, unless it is already there."""
+    if column not in get_columns(cursor, table):
+        cursor.execute(
+            'ALTER TABLE %s ADD COLUMN %s %s' % (table, column, type)
+        )
+
+
+@migration
+def initial(cursor):
+    """The tables which existed before migrations."""
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS files (id INTEGER NOT NULL, '
+        'path VARCHAR(500) NOT NULL, downloaded DATETIME, PRIMARY KEY (id))'
+    )
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS sections (id INTEGER NOT NULL, '
+        'name VARCHAR(50) NOT NULL, parent_id INTEGER, PRIMARY KEY (id), '
+        'FOREIGN KEY(parent_id) REFERENCES sections (id))'
+    )
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS hotkeys (id INTEGER NOT NULL, '
+        '"key" INTEGER, default_key INTEGER NOT NULL, modifiers INTEGER, '
+        'default_modifiers INTEGER NOT NULL, func_name VARCHAR(50) NOT NULL, '
+        'active BOOLEAN NOT NULL, control_id INTEGER, '
+        'section_id INTEGER NOT NULL, PRIMARY KEY (id), '
+        'CHECK (active IN (0, 1)), '
+        'FOREIGN KEY(section_id) REFERENCES sections (id))'
+    )
+
+
+@migration
+def download_progress(cursor):
+    """Record how much of a download has been done."""
+    add_column(cursor, 'files', 'progress', 'INTEGER')
+
+
+@migration
+def media_cache(cursor):
+    """The columns used by mmp.cache."""
+    add_column(cursor, 'files', 'size', 'INTEGER')
+    add_column(cursor, 'files', 'last_access', 'DATETIME')
+    add_column(cursor, 'files', 'partition', 'VARCHAR(100)')
+
+
+@migration
+def indexes(cursor):
+    """Speed up looking up files and hotkeys."""
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS ix_files_path ON files (path)'
+    )
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS ix_files_downloaded ON files (downloaded)'
+    )
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS ix_hotkeys_key_modifiers ON hotkeys '
+        '("key", modifiers)'
+    )
+
+
+@migration
+def searches(cursor):
+    """The table used by mmp.search_cache."""
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS searches (id INTEGER NOT NULL, '
+        'backend VARCHAR(100) NOT NULL, "query" VARCHAR(500) NOT NULL, '
+        'expires DATETIME NOT NULL, results BLOB NOT NULL, PRIMARY KEY (id))'
+    )
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS ix_searches_backend_query ON searches '
+        '(backend, "query")'
+    )
+
+
+@migration
+def catalogue(cursor):
+    """The table and full-text index used by mmp.catalogue."""
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS catalogue (id INTEGER NOT NULL, '
+        'backend VARCHAR(100) NOT NULL, "key" VARCHAR(500) NOT NULL, '
+        'artist VARCHAR(500), album VARCHAR(500), title VARCHAR(500), '
+        'seen DATETIME NOT NULL, data BLOB NOT NULL, PRIMARY KEY (id))'
+    )
+    cursor.execute(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_catalogue_backend_key ON '
+        'catalogue (backend, "key")'
+    )
+    for statement in fts_statements:
+        cursor.execute(statement)
+
+
+def get_version(cursor):
+    """Return the schema version of the database."""
+    cursor.execute('PRAGMA user_version')
+    return cursor.fetchone()[0]
+
+
+def set_version(cursor, version):
+    """Set the schema version of the database."""
+    cursor.execute('PRAGMA user_version = %d' % version)
+
+
+def is_empty(cursor):
+    """Return True if the database has no tables."""
+    cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table'")
+    return not cursor.fetchone()[0]
+
+
+def upgrade():
+    """Bring the database up to date. An empty database is created from the
+    models, otherwise each migration newer than the database is run."""
+    raw = engine.raw_connection()
+    connection = raw.connection  # The sqlite3 connection.
+    isolation_level = connection.isolation_level
+    # Stop sqlite3 committing before DDL statements, so we control the
+    # transactions.
+    connection.isolation_level = None
+    try:
+        cursor = connection.cursor()
+        version = get_version(cursor)
+        latest = len(migrations)
+        if version == latest:
+            return
+        if version > latest:
+            logger.warning(
+                'The database is version %d, but this program only knows '
+                'about version %d.', version, latest
+            )
+            return
+        if not version and is_empty(cursor):
+            logger.info('Creating the database.')
+            Base.metadata.create_all(engine)
+            set_version(cursor, latest)
+            return
+        for number, func in enumerate(migrations[version:], version + 1):
+            logger.info('Migrating the database to version %d.', number)
+            cursor.execute('BEGIN')
+            try:
+                func(cursor)
+                set_version(cursor, number)
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+    finally:
+        connection.isolation_level = isolation_level
+        raw.close()
@@ -0,0 +1,16 @@
+"""Search results which are remembered between runs."""
+
+from sqlalchemy import Column, String, DateTime, LargeBinary, Index
+from attrs_sqlalchemy import attrs_sqlalchemy
+from .base import Base
+
+
+@attrs_sqlalchemy
+class Search(Base):
+    """The pickled results of a search."""
+    __tablename__ = 'searches'
+    __table_args__ = (Index('ix_searches_backend_query', 'backend', 'query'),)
+    backend = Column(String(100), nullable=False)  # Backend short name.
+    query = Column(String(500), nullable=False)
+    expires = Column(DateTime(timezone=True), nullable=False)
+    results = Column(LargeBinary, nullable=False)
@@ -1,16 +1,23 @@
 """Provides the scoped session."""
 
 from contextlib import contextmanager
+from threading import local
 from sqlalchemy.orm import sessionmaker, scoped_session
 from .engine import engine
 
 session_factory = sessionmaker(bind=engine)
 Session = scoped_session(session_factory)
+batch = local()  # Holds the session of the bulk block on each thread.
 
 
 @contextmanager
 def session():
-    """Close the session when we're done."""
+    """Close the session when we're done. Inside a bulk block the session of
+    that block is used, and is left for it to commit."""
+    s = getattr(batch, 'session', None)
+    if s is not None:
+        yield s
+        return
     s = Session()
     try:
         yield s
@@ -20,3 +27,20 @@ def session():
         raise e
     finally:
         Session.remove()
+
+
+@contextmanager
+def bulk():
+    """Make every session block on this thread inside this one share a single
+    session, so loops which call functions using session commit once at the
+    end instead of once per call. If anything goes wrong it is all rolled
+    back."""
+    if getattr(batch, 'session', None) is not None:
+        yield batch.session  # Already inside a bulk block.
+        return
+    with session() as s:
+        batch.session = s
+        try:
+            yield s
+        finally:
+            batch.session = None
@@ -0,0 +1,211 @@
+"""Helpers for downloading files."""
+
+import logging
+import os
+import os.path
+from collections import Counter
+from concurrent.futures import Future
+from functools import partial
+from threading import Lock
+from time import time
+from urllib.parse import urlparse
+from attr import attrs, attrib, Factory
+from requests import get
+from .jobs import add_job, max_download_workers, priority_download
+
+logger = logging.getLogger(__name__)
+chunk_size = 1024 * 64
+partial_extension = '.part'
+max_per_host = 2  # The most files to download from one server at once.
+
+
+def get_partial_path(path):
+    """Return the path where the incomplete download of path is kept."""
+    return path + partial_extension
+
+
+def resume_headers(path, headers=None):
+    """Return a tuple of (position, headers), where position is the size of
+    the file at path (or 0 if it does not exist), and headers is a copy of
+    headers with a Range header added if position is not 0."""
+    headers = dict(headers or {})
+    position = 0
+    if os.path.isfile(path):
+        position = os.path.getsize(path)
+    if position:
+        headers['Range'] = 'bytes=%d-' % position
+    return (position, headers)
+
+
+def get_total(status, headers):
+    """Return the full size of the file being downloaded, from the status code
+    and headers of a response, or None if the server didn't say."""
+    if status == 206:
+        total = headers.get('Content-Range', '').rpartition('/')[2]
+    else:
+        total = headers.get('Content-Length', '')
+    if total.isdigit():
+        return int(total)
+
+
+def fetch_to_file(url, path, progress=None, headers=None, **kwargs):
+    """Download url to path a chunk at a time, returning the status code. If
+    path already exists the download is resumed from the end of it, provided
+    the server supports range requests. If progress is not None it is called
+    with the number of bytes in path, and the full size of the file (or None
+    if that is unknown), after each chunk. All extra kwargs are passed onto
+    requests.get."""
+    position, range_headers = resume_headers(path, headers)
+    r = get(url, stream=True, headers=range_headers, **kwargs)
+    if r.status_code == 416 and position:
+        # We can't trust what we have, so start again.
+        logger.info('Cannot resume %s, restarting.', path)
+        r.close()
+        os.remove(path)
+        return fetch_to_file(
+            url, path, progress=progress, headers=headers, **kwargs
+        )
+    if not r.ok:
+        return r.status_code
+    if r.status_code == 206:
+        logger.info('Resuming %s from byte %d.', path, position)
+    else:
+        position = 0  # The server has sent the whole file.
+    total = get_total(r.status_code, r.headers)
+    with open(path, 'ab' if position else 'wb') as f:
+        for chunk in r.iter_content(chunk_size=chunk_size):
+            f.write(chunk)
+            position += len(chunk)
+            if progress is not None:
+                progress(position, total)
+    return r.status_code
+
+
+@attrs
+class Download:
+    """A download which has been submitted to a DownloadManager. Rate and ETA
+    are measured from the first progress report, so the part of a resumed
+    download which was already there does not count."""
+
+    url = attrib()
+    path = attrib()
+    func = attrib()
+    progress = attrib(default=Factory(lambda: None))
+    future = attrib(default=Factory(Future), init=False)
+    active = attrib(default=Factory(bool), init=False)
+    position = attrib(default=Factory(int), init=False)
+    total = attrib(default=Factory(lambda: None), init=False)
+    first_position = attrib(default=Factory(lambda: None), init=False)
+    first_time = attrib(default=Factory(lambda: None), init=False)
+
+    @property
+    def host(self):
+        return urlparse(self.url).netloc
+
+    def update(self, position, total=None):
+        """Record progress, and pass it on to self.progress."""
+        if self.first_position is None:
+            self.first_position = position
+            self.first_time = time()
+        self.position = position
+        if total is not None:
+            self.total = total
+        if self.progress is not None:
+            self.progress(position, total)
+
+    @property
+    def rate(self):
+        """The speed of this download in bytes per second, or None."""
+        if self.first_time is None:
+            return None
+        elapsed = time() - self.first_time
+        if elapsed > 0:
+            return (self.position - self.first_position) / elapsed
+
+    @property
+    def eta(self):
+        """The number of seconds this download should take to finish, or
+        None."""
+        rate = self.rate
+        if rate and self.total is not None:
+            return max(0, self.total - self.position) / rate
+
+
+@attrs
+class DownloadManager:
+    """Runs downloads in the downloads lane of the jobs framework, at most
+    max_download_workers at once, and no more than max_per_host from any one
+    server. Downloads are keyed by path, so asking for a file which is already
+    downloading gets the existing download."""
+
+    lock = attrib(default=Factory(Lock), init=False)
+    downloads = attrib(default=Factory(dict), init=False)  # Keyed by path.
+
+    def submit(self, url, path, func, progress=None):
+        """Return a concurrent.futures.Future for the download of url to
+        path. When it is started, func is called in the downloads lane with a
+        function to report progress to, which takes the same arguments as the
+        progress argument of fetch_to_file. Whatever func returns or raises is
+        passed to the future. If progress is not None it is called whenever
+        func reports progress.
+
+        If path is already downloading or queued, the future of that download
+        is returned, and func and progress are not used."""
+        with self.lock:
+            d = self.downloads.get(path)
+            if d is not None:
+                logger.info('Waiting for the download of %s.', path)
+                return d.future
+            d = Download(url, path, func, progress=progress)
+            self.downloads[path] = d
+        self.pump()
+        return d.future
+
+    def pump(self):
+        """Start as many queued downloads as the limits allow, oldest
+        first."""
+        with self.lock:
+            active = [d for d in self.downloads.values() if d.active]
+            hosts = Counter(d.host for d in active)
+            for d in self.downloads.values():
+                if len(active) >= max_download_workers:
+                    break
+                if d.active or hosts[d.host] >= max_per_host:
+                    continue
+                d.active = True
+                active.append(d)
+                hosts[d.host] += 1
+                add_job(
+                    'Download %s' % d.path, partial(self.run, d),
+                    lane='downloads', priority=priority_download,
+                    kind='Download'
+                )
+
+    def run(self, download):
+        """A job to run a single download, then start the next one."""
+        try:
+            result = download.func(download.update)
+        except Exception as e:
+            logger.warning('Failed to download %s:', download.url)
+            logger.exception(e)
+            self.finish(download)
+            download.future.set_exception(e)
+        else:
+            self.finish(download)
+            download.future.set_result(result)
+        return True
+
+    def finish(self, download):
+        """Forget download, and start whatever can run in its place."""
+        with self.lock:
+            del self.downloads[download.path]
+        self.pump()
+
+    def get_downloads(self):
+        """Return a list of the Download instances which are running or
+        queued, in the order they were submitted."""
+        with self.lock:
+            return list(self.downloads.values())
+
+
+manager = DownloadManager()
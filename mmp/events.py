@@ -0,0 +1,41 @@
+"""A small dispatcher for player events.
+
+Events are usually dispatched from BASS's own threads, so handlers are always
+called from the realtime jobs lane rather than directly."""
+
+import logging
+from functools import partial
+from .jobs import add_job, priority_playback
+
+logger = logging.getLogger(__name__)
+handlers = {}  # Event names -> lists of functions.
+
+
+def register(name, func):
+    """Call func whenever the event called name is dispatched."""
+    handlers.setdefault(name, []).append(func)
+
+
+def unregister(name, func):
+    """Stop calling func for the event called name."""
+    handlers[name].remove(func)
+
+
+def run_handlers(name, args, kwargs):
+    """A job to call all the handlers for the event called name."""
+    for func in handlers.get(name, []):
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.warning('Error in handler %r for %s event:', func, name)
+            logger.exception(e)
+    return True
+
+
+def dispatch(name, *args, **kwargs):
+    """Dispatch the event called name. Safe to call from any thread."""
+    logger.debug('Dispatching %s event: %r, %r.', name, args, kwargs)
+    add_job(
+        '%s Event' % name.title(), partial(run_handlers, name, args, kwargs),
+        lane='realtime', priority=priority_playback
+    )
@@ -0,0 +1,87 @@
+"""Provides the TrackFormatter class, which turns tracks into the strings
+shown in the results lists."""
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+from weakref import ref
+from attr import attrs, attrib, asdict, Factory
+from .templates import environment
+
+logger = logging.getLogger(__name__)
+max_strings = 10000  # The most formatted strings to remember.
+
+
+@attrs
+class TrackFormatter:
+    """Formats tracks with the result format from the interface options.
+
+    The format is compiled once, when the option is set. Tracks are rendered
+    with a shallow copy of their attributes, and the string for each track
+    and backend is remembered until the format changes, so drawing a row
+    again costs a dictionary lookup. Code which changes a track after it has
+    been shown should call forget, so it is rendered again. Strings are keyed
+    by the identities of the track and backend, and the least recently used
+    are forgotten once there are more than max_strings."""
+
+    source = attrib(default=None, init=False)
+    template = attrib(default=None, init=False)
+    strings = attrib(default=Factory(OrderedDict), init=False)
+    lock = attrib(default=Factory(Lock), init=False)
+
+    def set_format(self, source):
+        """Compile source as the format. If it is different from the current
+        format, every remembered string is forgotten. Raises
+        jinja2.exceptions.TemplateError if source is invalid."""
+        if source == self.source:
+            return
+        template = environment.from_string(source)
+        with self.lock:
+            self.source = source
+            self.template = template
+            self.strings.clear()
+
+    def render(self, track, backend):
+        """Return track formatted with the current format. If that fails the
+        error is logged, and a plainer string is returned."""
+        try:
+            return self.template.render(
+                asdict(track, recurse=False), backend=backend
+            )
+        except Exception as e:
+            logger.warning('Unable to format %r:', track)
+            logger.exception(e)
+            return ' - '.join(
+                str(value) for value in (
+                    track.artist, track.album, track.title
+                ) if value
+            )
+
+    def format(self, track, backend):
+        """Return the string for track from backend, rendering it if it
+        hasn't been already."""
+        key = (id(track), id(backend))
+        with self.lock:
+            entry = self.strings.get(key)
+            # The weak reference stops a new track which happens to have the
+            # id of one which has been freed from getting its string.
+            if entry is not None and entry[0]() is track:
+                self.strings.move_to_end(key)
+                return entry[1]
+        string = self.render(track, backend)
+        with self.lock:
+            self.strings[key] = (ref(track), string)
+            self.strings.move_to_end(key)
+            while len(self.strings) > max_strings:
+                self.strings.popitem(last=False)
+        return string
+
+    def forget(self, track):
+        """Forget the strings for track, so the next call to format renders
+        it again. Call this after changing a track."""
+        with self.lock:
+            for key in [key for key in self.strings if key[0] == id(track)]:
+                del self.strings[key]
+
+
+formatter = TrackFormatter()
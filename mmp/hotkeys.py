@@ -2,98 +2,151 @@
 
 import logging
 import six
-from sqlalchemy import and_, or_
 from .db import session, Hotkey, Section
 
 logger = logging.getLogger(__name__)
 functions = {}
+# Lists of (id, control_id, func_name) tuples, keyed by (key, modifiers,
+# control_id), so handling a key does not touch the database. It is compiled
+# by register.
+keymap = {}
 
-# Hotkey sections.
-with session() as s:
-    for var, name in (
-        ('main', 'Main'),
-        ('media', 'Media'),
-    ):
-        section = Section(name=name)
-        s.add(section)
-        s.commit()
-        locals()['section_%s' % var] = section.id
-    del section
+sections = {}  # Section ids, keyed by (name, parent_id).
+pending_sections = []  # Sections which have not been saved yet.
+pending_hotkeys = []  # Keyword arguments for Hotkey, not saved yet.
+registered = False  # Set to True by register.
 
 
 def add_section(name, parent_id=None):
-    """Return a section named name as a subsection of the Section instance with
-    the id of parent_id."""
+    """Return the id of a section named name as a subsection of the Section
+    instance with the id of parent_id. Sections are kept in memory until
+    register is called."""
+    section_id = sections.get((name, parent_id))
+    if section_id is None:
+        # The sections table is emptied by the first call to register, so
+        # ids can be handed out before anything is saved.
+        section_id = len(sections) + 1
+        sections[(name, parent_id)] = section_id
+        pending_sections.append(
+            dict(id=section_id, name=name, parent_id=parent_id)
+        )
+        if registered:
+            register()
+    return section_id
+
+
+section_main = add_section('Main')
+section_media = add_section('Media')
+
+
+def register():
+    """Save all the sections and hotkeys added since the last call in one
+    transaction, then compile the keymap. The first call also clears the
+    sections table and deactivates hotkeys which were not added again, keeping
+    their bindings in case they come back in a later run. Until then,
+    add_section and add_hotkey only touch memory, so startup does not need a
+    transaction for each of them."""
+    global registered, pending_sections, pending_hotkeys
+    new_sections, pending_sections = pending_sections, []
+    new_hotkeys, pending_hotkeys = pending_hotkeys, []
+    with session() as s:
+        if not registered:
+            s.query(Section).delete()
+        if new_sections:
+            s.bulk_insert_mappings(Section, new_sections)
+        existing = {}
+        for hotkey in s.query(Hotkey):
+            existing[
+                (
+                    hotkey.default_modifiers, hotkey.default_key,
+                    hotkey.func_name, hotkey.section_id
+                )
+            ] = hotkey
+        found = set()
+        for kwargs in new_hotkeys:
+            key = (
+                kwargs['default_modifiers'], kwargs['default_key'],
+                kwargs['func_name'], kwargs['section_id']
+            )
+            hotkey = existing.get(key)
+            if hotkey is None:
+                hotkey = Hotkey(**kwargs)
+                s.add(hotkey)
+                existing[key] = hotkey
+                logger.info('Registered hotkey %r.', hotkey)
+            else:
+                hotkey.control_id = kwargs['control_id']
+                hotkey.active = True
+            found.add(id(hotkey))
+        if not registered:
+            for hotkey in existing.values():
+                if id(hotkey) not in found:
+                    # Its backend may not have loaded this time.
+                    hotkey.active = False
+    logger.info(
+        'Registered %d %s and %d %s.', len(new_sections),
+        'section' if len(new_sections) == 1 else 'sections',
+        len(new_hotkeys), 'hotkey' if len(new_hotkeys) == 1 else 'hotkeys'
+    )
+    registered = True
+    compile_keymap()
+
+
+def compile_keymap():
+    """Rebuild keymap from the active hotkeys in the database. This should be
+    called whenever a binding changes."""
+    global keymap
+    new = {}
     with session() as s:
-        section = s.query(Section).filter_by(
-            name=name, parent_id=parent_id
-        ).first()
-        if section is None:
-            section = Section(name=name, parent_id=parent_id)
-        s.add(section)
-        s.commit()
-        return section.id
+        for hotkey in s.query(Hotkey).filter_by(active=True).order_by(
+            Hotkey.id
+        ):
+            if hotkey.key is None:
+                key = hotkey.default_key
+                modifiers = hotkey.default_modifiers
+            else:
+                key = hotkey.key
+                modifiers = hotkey.modifiers
+            new.setdefault((key, modifiers, hotkey.control_id), []).append(
+                (hotkey.id, hotkey.control_id, hotkey.func_name)
+            )
+    keymap = new
+    logger.info('Compiled %d key bindings.', len(keymap))
 
 
 def handle_hotkey(event):
     """Handle an incoming hotkey."""
     key = event.GetKeyCode()
     modifiers = event.GetModifiers()
-    with session() as s:
-        l = s.query(Hotkey).filter(
-            and_(
-                or_(
-                    and_(
-                        Hotkey.key == key,
-                        Hotkey.modifiers == modifiers
-                    ),
-                    and_(
-                        Hotkey.key.is_(None),
-                        Hotkey.default_key == key,
-                        Hotkey.modifiers.is_(None),
-                        Hotkey.default_modifiers == modifiers
-                    )
-                ),
-                or_(
-                    Hotkey.control_id.is_(None),
-                    Hotkey.control_id == event.EventObject.GetId()
-                )
-            )
-        )
-        if not l.count():
-            return event.Skip()
-        for hotkey in l:
-            logger.info('Running %r.', hotkey)
-            functions[
-                (hotkey.control_id, hotkey.func_name)
-            ](event)
-            if event.Skipped:
-                logger.info('Done.')
-                break  # Stop execution.
+    hotkeys = keymap.get((key, modifiers, None), []) + keymap.get(
+        (key, modifiers, event.EventObject.GetId()), []
+    )
+    if not hotkeys:
+        return event.Skip()
+    for hotkey_id, control_id, func_name in sorted(hotkeys):
+        logger.info('Running hotkey %d.', hotkey_id)
+        functions[(control_id, func_name)](event)
+        if event.Skipped:
+            logger.info('Done.')
+            break  # Stop execution.
 
 
 def add_hotkey(key, func, modifiers=0, control=None, section_id=1):
     """Add a hotkey bound to key with optional modifiers. If control is not
     None the key will only work when that control has focus, otherwise it is
     global to the application. If section is not provided the top-level section
-    will be assumed."""
+    will be assumed. The hotkey is saved by register."""
     if control is not None:
         control = control.GetId()
     if isinstance(key, six.string_types):
         key = ord(key)
-    with session() as s:
-        kwargs = dict(
+    functions[(control, func.__name__)] = func
+    pending_hotkeys.append(
+        dict(
             default_modifiers=modifiers, default_key=key,
-            func_name=func.__name__, section_id=section_id
+            func_name=func.__name__, section_id=section_id,
+            control_id=control, active=True
         )
-        q = s.query(Hotkey).filter_by(**kwargs)
-        if q.count():
-            hotkey = q.first()
-            logger.info('Found hotkey %r.', hotkey)
-        else:
-            hotkey = Hotkey(**kwargs)
-            logger.info('Registered hotkey %r.', hotkey)
-        hotkey.control_id = control
-        hotkey.active = True
-        functions[(hotkey.control_id, hotkey.func_name)] = func
-        s.add(hotkey)
+    )
+    if registered:
+        register()
@@ -1,53 +1,299 @@
 """The jobs framework."""
 
+import json
 import logging
+from heapq import heappush, heappop
+from itertools import count
+from queue import PriorityQueue
+from threading import Condition, Thread
 from time import time
 import wx
 from attr import attrs, attrib, Factory
 from . import app
 
 logger = logging.getLogger(__name__)
-jobs = []
+jobs = []  # A heap of (next_run, sequence, job) tuples.
+keys = {}  # Pending jobs which were added with a key.
+stats = {}  # JobStats instances, keyed by job name.
+condition = Condition()
+sequence = count()  # Keeps jobs due at the same time in the order added.
+max_io_workers = 4
+max_download_workers = 3
+max_search_workers = 4
+
+# Job priorities. When several jobs are due at once in the same lane, the one
+# with the lowest number runs first.
+priority_playback = 0
+priority_ui = 1
+priority_normal = 2
+priority_download = 3
 
 
 @attrs
 class Job:
-    """A job object."""
+    """A job object. This is returned by add_job, and can be used to cancel
+    the job, or to change its priority before it is next run."""
 
     name = attrib()
     func = attrib()
     run_every = attrib()
+    lane = attrib(default=Factory(lambda: 'io'))
+    priority = attrib(default=Factory(lambda: priority_normal))
+    key = attrib(default=Factory(lambda: None))
+    kind = attrib(default=Factory(lambda: None))
+    cancelled = attrib(default=Factory(bool), init=False)
     last_run = attrib(default=Factory(int), init=False)
+    next_run = attrib(default=Factory(int), init=False)
 
+    def cancel(self):
+        """Stop this job from running again. If it is already running it will
+        finish, but will not be rescheduled."""
+        with condition:
+            self.cancelled = True
+            if self.key is not None and keys.get(self.key) is self:
+                del keys[self.key]
 
-def run_jobs():
-    while app.running:
-        if not jobs:
-            continue  # Nothing to do.
-        now = time()
-        current_job = jobs.pop(0)
-        if current_job.run_every is None or (
-            now - current_job.last_run >= current_job.run_every
-        ):
-            try:
-                dont_stop = current_job.func()
-                current_job.last_run = time()
-                if dont_stop:
-                    continue
-            except Exception as e:
-                logger.exception(e)
-                wx.CallAfter(
-                    app.frame.on_error,
-                    'Error with job %s: %s.' % (current_job.name, e)
-                )
+    def get_kind(self):
+        """Return the name its stats are kept under."""
+        return self.name if self.kind is None else self.kind
+
+
+@attrs
+class JobStats:
+    """Runtime statistics for all jobs of a given kind. Times are in
+    seconds. Lag is how long after its due time a job actually started, so it
+    includes any time spent waiting for a free worker."""
+
+    name = attrib()
+    runs = attrib(default=Factory(int), init=False)
+    errors = attrib(default=Factory(int), init=False)
+    overruns = attrib(default=Factory(int), init=False)
+    total_time = attrib(default=Factory(float), init=False)
+    max_time = attrib(default=Factory(float), init=False)
+    total_lag = attrib(default=Factory(float), init=False)
+    max_lag = attrib(default=Factory(float), init=False)
+    last_run = attrib(default=Factory(float), init=False)
+
+    def add_run(self, job, started, finished, error=False):
+        """Record a single run of job."""
+        taken = finished - started
+        lag = max(0.0, started - job.next_run)
+        self.runs += 1
+        self.last_run = finished
+        self.total_time += taken
+        self.max_time = max(self.max_time, taken)
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        if error:
+            self.errors += 1
+        if job.run_every and taken > job.run_every:
+            self.overruns += 1
+
+    @property
+    def average_time(self):
+        return self.total_time / self.runs if self.runs else 0.0
+
+    @property
+    def average_lag(self):
+        return self.total_lag / self.runs if self.runs else 0.0
+
+    def to_dict(self):
+        """Return a dictionary suitable for dumping as JSON."""
+        return dict(
+            name=self.name, runs=self.runs, errors=self.errors,
+            overruns=self.overruns, total_time=self.total_time,
+            average_time=self.average_time, max_time=self.max_time,
+            total_lag=self.total_lag, average_lag=self.average_lag,
+            max_lag=self.max_lag, last_run=self.last_run
+        )
+
+
+@attrs
+class Lane:
+    """A queue of due jobs, serviced by one or more worker threads. A single
+    job never runs on two workers at once, because it is only rescheduled once
+    it has finished."""
+
+    name = attrib()
+    workers = attrib()
+    queue = attrib(default=Factory(PriorityQueue), init=False)
+    threads = attrib(default=Factory(list), init=False)
+
+    def start(self):
+        """Start the worker threads."""
+        for i in range(self.workers):
+            t = Thread(
+                target=self.work, name='%s jobs %d' % (self.name, i),
+                daemon=True
+            )
+            t.start()
+            self.threads.append(t)
+
+    def stop(self):
+        """Tell all the worker threads to exit once they are idle."""
+        for t in self.threads:
+            self.queue.put((float('inf'), next(sequence), None))
+        self.threads.clear()
+
+    def put(self, job):
+        """Queue job to be run as soon as a worker is free."""
+        self.queue.put((job.priority, next(sequence), job))
+
+    def work(self):
+        """Run jobs from self.queue until told to stop."""
+        while True:
+            priority, _, job = self.queue.get()
+            if job is None:
+                break
+            if not job.cancelled:
+                run_job(job)
+
+
+# Play Manager and anything which ticks the UI runs in the realtime lane, so
+# slow network calls in the io lane cannot hold them up.
+# Downloads have their own lane, so jobs in the io lane can wait for them.
+# Searches have their own lane too, because a backend which hangs keeps its
+# worker until it gives up, and preloading needs the io lane.
+lanes = {
+    'realtime': Lane('realtime', 1),
+    'io': Lane('io', max_io_workers),
+    'downloads': Lane('downloads', max_download_workers),
+    'search': Lane('search', max_search_workers)
+}
+
+
+def schedule(job, delay=0):
+    """Push job onto the heap and wake the jobs thread. The job will not run
+    for at least delay seconds."""
+    job.next_run = max(time() + delay, job.last_run + (job.run_every or 0))
+    with condition:
+        if job.key is not None:
+            keys.setdefault(job.key, job)
+        heappush(jobs, (job.next_run, next(sequence), job))
+        condition.notify()
+
+
+def next_job():
+    """Block until a job is due and return it. Returns None if app.running is
+    set to False while waiting. Cancelled jobs are discarded."""
+    with condition:
+        while app.running:
+            if not jobs:
+                condition.wait()
+                continue
+            next_run, _, job = jobs[0]
+            if job.cancelled:
+                heappop(jobs)
                 continue
-        jobs.append(current_job)
+            delay = next_run - time()
+            if delay > 0:
+                condition.wait(delay)
+            else:
+                heappop(jobs)
+                return job
+
+
+def run_job(job):
+    """Run a single job, rescheduling it unless it returns True, raises, or is
+    cancelled."""
+    with condition:
+        if job.key is not None and keys.get(job.key) is job:
+            # Anything added with the same key from now on is new work.
+            del keys[job.key]
+        kind = job.get_kind()
+        job_stats = stats.get(kind)
+        if job_stats is None:
+            job_stats = JobStats(kind)
+            stats[kind] = job_stats
+    started = time()
+    try:
+        dont_stop = job.func()
+    except Exception as e:
+        with condition:
+            job_stats.add_run(job, started, time(), error=True)
+        logger.exception(e)
+        wx.CallAfter(
+            app.frame.on_error,
+            'Error with job %s: %s.' % (job.name, e)
+        )
+        return
+    job.last_run = time()
+    with condition:
+        job_stats.add_run(job, started, job.last_run)
+    if not dont_stop and not job.cancelled:
+        schedule(job)
+
 
+def run_jobs():
+    """Hand jobs to their lanes as they fall due. Jobs are kept in a heap
+    ordered by the time they should next run, so this thread sleeps until the
+    earliest one is due or until add_job or stop_jobs wakes it up."""
+    for lane in lanes.values():
+        lane.start()
+    while True:
+        current_job = next_job()
+        if current_job is None:
+            break  # We are closing.
+        lanes[current_job.lane].put(current_job)
+    for lane in lanes.values():
+        lane.stop()
+
+
+def get_stats():
+    """Return a list of JobStats instances, the slowest first."""
+    with condition:
+        return sorted(
+            stats.values(), key=lambda s: s.total_time, reverse=True
+        )
+
+
+def dump_stats(filename):
+    """Write the stats for every job which has run to filename as JSON."""
+    with open(filename, 'w') as f:
+        json.dump([s.to_dict() for s in get_stats()], f, indent=4)
 
-def add_job(name, func, run_every=None):
+
+def stop_jobs():
+    """Set app.running to False and wake the jobs thread so it can exit."""
+    with condition:
+        app.running = False
+        condition.notify_all()
+
+
+def add_job(
+    name, func, run_every=None, lane='io', priority=priority_normal, key=None,
+    delay=0, kind=None
+):
     """Add a job to the jobs queue. If func returns True the job will never run
     again. If run_every is not None run the job when the given time has
-    elapsed."""
-    j = Job(name, func, run_every)
-    jobs.append(j)
-    return j
+    elapsed. The first run happens after delay seconds. The job is run by the
+    lane named lane: "io" for anything which might block, "realtime" for
+    playback and UI updates, "downloads", which is used by
+    mmp.downloads.DownloadManager, or "search" for the on_search hooks of
+    backends. When several jobs are due at once, those
+    with a lower priority number run first.
+
+    Statistics are kept for each kind of job. If kind is None it is name, so
+    jobs whose names include a track or a path should pass a kind, or there
+    will be a row of statistics for every one of them.
+
+    If key is not None and a job with the same key is still waiting to run,
+    that job is given the new name and func and returned instead, so only the
+    most recent request is carried out."""
+    if lane not in lanes:
+        raise ValueError('Invalid lane: %r.' % lane)
+    with condition:
+        j = keys.get(key)
+        if j is not None:
+            logger.debug('Merging %s into %r.', name, j)
+            j.name = name
+            j.kind = kind
+            j.func = func
+            j.priority = min(j.priority, priority)
+            return j
+        j = Job(
+            name, func, run_every, lane=lane, priority=priority, key=key,
+            kind=kind
+        )
+        schedule(j, delay=delay)
+        return j
@@ -0,0 +1,175 @@
+"""Provides the PlayQueue class, which holds the tracks to play next."""
+
+from collections import deque
+from random import getrandbits
+from threading import RLock
+from attr import attrs, attrib, Factory
+
+rounds = 4  # Rounds of the Feistel network used by Permutation.
+
+
+@attrs
+class Permutation:
+    """A random order of range(size) which is worked out one index at a time,
+    so shuffling a large list doesn't need a copy of it.
+
+    Indices are scrambled by a small Feistel network over the smallest even
+    number of bits which can hold size, and any which land outside range(size)
+    are scrambled again until they don't."""
+
+    size = attrib()
+    keys = attrib(
+        default=Factory(lambda: [getrandbits(32) for _ in range(rounds)])
+    )
+    half = attrib(default=Factory(int), init=False)  # Bits in each half.
+    mask = attrib(default=Factory(int), init=False)
+
+    def __attrs_post_init__(self):
+        bits = max(2, (self.size - 1).bit_length())
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+
+    def __len__(self):
+        return self.size
+
+    def scramble(self, index):
+        """Return index after one pass through the network."""
+        left, right = index >> self.half, index & self.mask
+        for key in self.keys:
+            left, right = right, left ^ (hash((right, key)) & self.mask)
+        return (left << self.half) | right
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        index = self.scramble(index)
+        while index >= self.size:
+            index = self.scramble(index)
+        return index
+
+
+@attrs
+class PlayQueue:
+    """The tracks to play after the current one.
+
+    Most of the queue is usually the rest of a results list. Rather than
+    copying it, the queue refers to the rows of source between start and stop,
+    and only fetches a track when it is needed. Tracks which are put back at
+    the front (with appendleft) are played before those rows, and tracks which
+    are appended are played after them. Taking the next track, and adding one
+    at either end, never depends on the length of the queue.
+
+    If the queue is shuffled, the rows of source which have not been played
+    yet are played in the order of a Permutation instead."""
+
+    source = attrib(default=Factory(tuple), init=False)
+    get = attrib(default=None, init=False)  # Gets a track from a row.
+    start = attrib(default=Factory(int), init=False)
+    stop = attrib(default=Factory(int), init=False)
+    position = attrib(default=Factory(int), init=False)  # Rows played.
+    permutation = attrib(default=None, init=False)
+    first = attrib(default=Factory(deque), init=False)
+    last = attrib(default=Factory(deque), init=False)
+    lock = attrib(default=Factory(RLock), init=False)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.first) + self.remaining + len(self.last)
+
+    def __getitem__(self, index):
+        """Return the track at index, or a list of tracks if index is a
+        slice."""
+        with self.lock:
+            if isinstance(index, slice):
+                return [self[i] for i in range(*index.indices(len(self)))]
+            if index < 0:
+                index += len(self)
+            if index < 0:
+                raise IndexError('Queue index out of range.')
+            if index < len(self.first):
+                return self.first[index]
+            index -= len(self.first)
+            if index < self.remaining:
+                return self.get_row(index)
+            return self.last[index - self.remaining]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            try:
+                yield self[index]
+            except IndexError:
+                return  # The queue has been changed.
+
+    @property
+    def remaining(self):
+        """The number of rows of source which have not been played."""
+        return self.stop - self.start - self.position
+
+    def get_row(self, offset):
+        """Return the track from the row offset rows after the next one to be
+        played."""
+        index = self.position + offset
+        if self.permutation is not None:
+            index = self.permutation[index]
+        row = self.source[self.start + index]
+        return row if self.get is None else self.get(row)
+
+    def clear(self):
+        """Remove every track."""
+        with self.lock:
+            self.first.clear()
+            self.last.clear()
+            self.source = ()
+            self.get = None
+            self.start = 0
+            self.stop = 0
+            self.position = 0
+            self.permutation = None
+
+    def play_from(self, source, start=0, stop=None, get=None):
+        """Replace the queue with the rows of source from start to stop (or
+        the end). If get is not None, it is called with a row to get its
+        track. Source is not copied, so it shouldn't be changed before stop
+        while the queue is using it."""
+        with self.lock:
+            self.clear()
+            if stop is None:
+                stop = len(source)
+            self.source = source
+            self.get = get
+            self.start = start
+            self.stop = max(start, stop)
+
+    def popleft(self):
+        """Remove and return the next track."""
+        with self.lock:
+            if self.first:
+                return self.first.popleft()
+            if self.remaining:
+                track = self.get_row(0)
+                self.position += 1
+                return track
+            if self.last:
+                return self.last.popleft()
+            raise IndexError('Pop from an empty queue.')
+
+    def appendleft(self, track):
+        """Make track the next track to be played."""
+        with self.lock:
+            self.first.appendleft(track)
+
+    def append(self, track):
+        """Add track to the end of the queue."""
+        with self.lock:
+            self.last.append(track)
+
+    def shuffle(self):
+        """Play the rows of source which haven't been played yet in a random
+        order."""
+        with self.lock:
+            if self.permutation is not None:
+                return
+            self.start += self.position
+            self.position = 0
+            if self.remaining > 1:
+                self.permutation = Permutation(self.remaining)
@@ -0,0 +1,156 @@
+"""Download the tracks at the front of the queue before they are played, so
+they play from the media cache rather than the network."""
+
+import logging
+from functools import partial
+from threading import Lock
+from time import time, sleep
+from attr import attrs, attrib, Factory
+from . import app, sound
+from .backends import DownloadStates
+from .config import config
+from .jobs import add_job, priority_download
+
+logger = logging.getLogger(__name__)
+run_every = 2.0  # How often to check the queue.
+max_prefetches = 2  # The most tracks to download at once.
+starved_delay = 1.0  # How long to wait while the playing stream catches up.
+active = {}  # Tracks being downloaded, keyed by id.
+handled = {}  # Tracks which are cached or could not be prefetched.
+
+
+class PrefetchCancelled(Exception):
+    """The track left the front of the queue without being played while it
+    was downloading."""
+
+
+@attrs
+class Throttle:
+    """Limits the combined speed of all prefetches."""
+
+    lock = attrib(default=Factory(Lock), init=False)
+    next_time = attrib(default=Factory(float), init=False)
+
+    def consume(self, size):
+        """Sleep for long enough that size bytes fit within the speed limit."""
+        rate = config.files['prefetch_rate'] * 1024
+        if not rate:
+            return
+        with self.lock:
+            now = time()
+            self.next_time = max(self.next_time, now) + size / rate
+            delay = self.next_time - now
+        if delay > 0:
+            sleep(delay)
+
+
+throttle = Throttle()
+
+
+def get_upcoming():
+    """Return the tracks which should be prefetched."""
+    return sound.queue[:config.files['prefetch_tracks']]
+
+
+def is_upcoming(track):
+    """Return True if track is still one of the upcoming tracks."""
+    return any(t is track for t in get_upcoming())
+
+
+def is_playing(track):
+    """Return True if track is being opened or played."""
+    if sound.opening is track:
+        return True
+    return any(
+        playing is not None and playing.track is track
+        for playing in (sound.old_stream, sound.new_stream, sound.next_stream)
+    )
+
+
+def progress_limiter(track):
+    """Return a function to pass as the progress argument of
+    Backend.submit_download, which throttles the download, waits while the
+    playing stream is starved, and raises PrefetchCancelled if track leaves
+    the upcoming tracks without being played."""
+    last_position = None
+    played = False
+
+    def progress(position, total=None):
+        nonlocal last_position, played
+        if last_position is not None:
+            throttle.consume(max(0, position - last_position))
+        last_position = position
+        while app.running and sound.is_starved():
+            sleep(starved_delay)
+        if not app.running:
+            raise PrefetchCancelled()
+        if not played:
+            # Taking a track from the queue to play it is not a reason to
+            # stop.
+            played = is_playing(track)
+            if not played and not is_upcoming(track):
+                raise PrefetchCancelled()
+
+    return progress
+
+
+def prefetch(track):
+    """A job to give the download of track to the download manager."""
+    try:
+        download = track.get_download()
+        if download is not None:
+            backend, url, name = download
+            if backend.get_download_state(name) is DownloadStates.none:
+                logger.info('Prefetching %r.', track)
+                backend.submit_download(
+                    url, name, progress=progress_limiter(track)
+                ).add_done_callback(partial(finish, track))
+                return True
+    except Exception as e:
+        logger.warning('Failed to prefetch %r:', track)
+        logger.exception(e)
+    del active[id(track)]
+    handled[id(track)] = track
+    return True
+
+
+def finish(track, future):
+    """Called with the future of the download of track when it is done.
+    Failures have already been logged by the download manager."""
+    del active[id(track)]
+    if isinstance(future.exception(), PrefetchCancelled):
+        logger.info('Stopped prefetching %r.', track)
+    else:
+        # AlreadyDownloadingError means it is being streamed, and will be
+        # cached that way.
+        handled[id(track)] = track
+
+
+def check_queue():
+    """A job to start prefetching upcoming tracks, unless the playing stream
+    needs the bandwidth."""
+    upcoming = get_upcoming()
+    ids = {id(t) for t in upcoming}
+    for key in list(handled):
+        if key not in ids:
+            del handled[key]
+    if sound.is_starved():
+        return
+    for track in upcoming:
+        if len(active) >= max_prefetches:
+            break
+        if id(track) in active or id(track) in handled:
+            continue
+        active[id(track)] = track
+        add_job(
+            'Prefetch %r' % track, partial(prefetch, track),
+            priority=priority_download, kind='Prefetch'
+        )
+
+
+def start():
+    """Start checking the queue for tracks to prefetch."""
+    add_job(
+        'Check Prefetches', check_queue, run_every=run_every,
+        priority=priority_download, key='check prefetches'
+    )
@@ -0,0 +1,192 @@
+"""Remember the results of searches, so repeating a search does not need the
+network.
+
+Results are kept in memory for the search time of their backend, and the
+least recently used searches are forgotten once there are more than
+max_searches. Backends which set persist_searches also have their results
+pickled to the database, so they survive a restart."""
+
+import logging
+import pickle
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import partial
+from threading import Lock
+from time import time
+from attr import attrs, attrib, Factory
+from . import aio
+from .db import session, Search
+from .jobs import add_job, priority_download
+
+logger = logging.getLogger(__name__)
+max_searches = 200
+
+
+def normalise(query):
+    """Return query in the form used for keys, so searches which only differ
+    in case or spacing share results."""
+    return ' '.join(query.lower().split())
+
+
+@attrs
+class SearchStats:
+    """Hit and miss counters for one backend."""
+
+    hits = attrib(default=Factory(int), init=False)
+    misses = attrib(default=Factory(int), init=False)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@attrs
+class SearchCache:
+    """Lists of results, keyed by (backend short name, normalised query)."""
+
+    entries = attrib(default=Factory(OrderedDict), init=False)
+    stats = attrib(default=Factory(dict), init=False)
+    lock = attrib(default=Factory(Lock), init=False)
+
+    def get_stats(self, backend):
+        """Return the SearchStats for backend."""
+        with self.lock:
+            return self.stats.setdefault(backend.short_name, SearchStats())
+
+    def get(self, backend, query):
+        """Return a copy of the results of searching backend for query which
+        are held in memory, or None. This never touches the database."""
+        key = (backend.short_name, normalise(query))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, results = entry
+                if expires > time():
+                    self.entries.move_to_end(key)
+                    return list(results)
+                del self.entries[key]
+
+    def put(self, backend, query, results, persist=True):
+        """Remember results for the search time of backend. If persist
+        evaluates to True and backend.persist_searches is set, the results
+        are saved to the database in the background."""
+        ttl = backend.get_search_ttl()
+        if not ttl or not results:
+            return
+        key = (backend.short_name, normalise(query))
+        with self.lock:
+            self.entries[key] = (time() + ttl, list(results))
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_searches:
+                self.entries.popitem(last=False)
+        if persist and backend.persist_searches:
+            add_job(
+                'Save Search', partial(save, key, ttl, list(results)),
+                priority=priority_download
+            )
+
+    def load(self, backend, query):
+        """Return results for query from the database, or None. This blocks,
+        so call it from a job or an executor."""
+        key = (backend.short_name, normalise(query))
+        with session() as s:
+            row = s.query(Search).filter_by(
+                backend=key[0], query=key[1]
+            ).filter(Search.expires > datetime.utcnow()).first()
+            if row is None:
+                return None
+            try:
+                results = pickle.loads(row.results)
+            except Exception as e:
+                logger.warning('Unable to load the results for %r:', key)
+                logger.exception(e)
+                return None
+        self.put(backend, query, results, persist=False)
+        return results
+
+    def lookup(self, backend, query):
+        """Return results from memory or the database, counting a hit or a
+        miss."""
+        results = self.get(backend, query)
+        if results is None and backend.persist_searches:
+            results = self.load(backend, query)
+        self.count(backend, results is not None)
+        return results
+
+    async def lookup_async(self, backend, query):
+        """The same as lookup, but the database is read in the executor of the
+        asyncio loop."""
+        results = self.get(backend, query)
+        if results is None and backend.persist_searches:
+            results = await aio.loop.run_in_executor(
+                None, self.load, backend, query
+            )
+        self.count(backend, results is not None)
+        return results
+
+    def count(self, backend, hit):
+        """Record a hit or a miss for backend."""
+        stats = self.get_stats(backend)
+        with self.lock:
+            if hit:
+                stats.hits += 1
+            else:
+                stats.misses += 1
+
+    def wrap(self, backend, func):
+        """Return a version of func, the on_search hook of backend, which uses
+        the cache. If func is a coroutine function, so is the result."""
+        if aio.is_async(func):
+            async def on_search(query):
+                results = await self.lookup_async(backend, query)
+                if results is None:
+                    results = await func(query)
+                    self.put(backend, query, results)
+                return results
+        else:
+            def on_search(query):
+                results = self.lookup(backend, query)
+                if results is None:
+                    results = func(query)
+                    self.put(backend, query, results)
+                return results
+        on_search.__doc__ = func.__doc__
+        return on_search
+
+    def log_stats(self):
+        """Log the counters for every backend."""
+        with self.lock:
+            for name, stats in sorted(self.stats.items()):
+                logger.info(
+                    'Searches of %s: %d hits, %d misses (%.0f%%).', name,
+                    stats.hits, stats.misses, stats.hit_rate * 100
+                )
+
+
+def save(key, ttl, results):
+    """A job to save results to the database under key, replacing any older
+    results, and delete any results which have expired."""
+    try:
+        data = pickle.dumps(results)
+    except Exception as e:
+        logger.warning('Unable to save the results for %r:', key)
+        logger.exception(e)
+        return True
+    now = datetime.utcnow()
+    with session() as s:
+        s.query(Search).filter(
+            (Search.expires <= now) | (
+                (Search.backend == key[0]) & (Search.query == key[1])
+            )
+        ).delete(synchronize_session=False)
+        s.add(
+            Search(
+                backend=key[0], query=key[1], results=data,
+                expires=now + timedelta(seconds=ttl)
+            )
+        )
+    return True
+
+
+search_cache = SearchCache()
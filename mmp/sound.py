@@ -1,18 +1,27 @@
 """Sound-related stuff."""
 
 import logging
-from time import time
+from functools import partial
 import wx
-from sound_lib.main import BassError
+from sound_lib.main import BassError, bass_call
 from sound_lib.output import Output
-from attr import attrs, attrib
-from .jobs import add_job
-from . import app
+from sound_lib.stream import URLStream
+from sound_lib.external.pybass import (
+    BASS_ChannelSetSync, BASS_ChannelRemoveSync, SYNCPROC, BASS_SYNC_POS,
+    BASS_SYNC_END, BASS_SYNC_STALL, BASS_SYNC_DOWNLOAD,
+    BASS_StreamGetFilePosition, BASS_FILEPOS_CURRENT, BASS_FILEPOS_DOWNLOAD,
+    BASS_FILEPOS_END
+)
+from attr import attrs, attrib, Factory
+from .jobs import add_job, priority_playback, priority_ui
+from .config import config
+from .play_queue import PlayQueue
+from . import app, events
 
 logger = logging.getLogger(__name__)
-last_run = 0
 run_every = 0.1
 zeroed = False
+min_buffer = 5  # Seconds which should be downloaded ahead of playback.
 title = None  # Old frame title.
 
 
@@ -22,13 +31,22 @@ class Playing:
 
     track = attrib()
     stream = attrib()
+    stalled = attrib(default=Factory(bool), init=False)
+    # (handle, callback) pairs, so the callbacks are not garbage collected
+    # while BASS can still call them.
+    syncs = attrib(default=Factory(list), init=False)
+    position_syncs = attrib(default=Factory(list), init=False)
 
 
 output = Output()
 played = []
-queue = []
+queue = PlayQueue()
 old_stream = None
 new_stream = None
+next_stream = None  # A Playing instance for queue[0], opened ahead of time.
+preloading = None  # The track which is being opened as next_stream.
+opening = None  # The track which is being opened to play now.
+preload_failed = None  # The last track which could not be preloaded.
 
 
 def get_length_position(stream):
@@ -44,6 +62,36 @@ def get_length_position(stream):
     return (l, p)
 
 
+def is_starved(playing=None):
+    """Return True if playing (or new_stream) is stalled, or is streaming and
+    has less than min_buffer seconds downloaded ahead of the playback
+    position. Other downloads should wait while this is the case, so they
+    don't compete with it for bandwidth."""
+    if playing is None:
+        playing = new_stream
+    if playing is None:
+        return False
+    if playing.stalled:
+        return True
+    stream = playing.stream
+    if not isinstance(stream, URLStream):
+        return False
+    try:
+        end = BASS_StreamGetFilePosition(stream.handle, BASS_FILEPOS_END)
+        downloaded = BASS_StreamGetFilePosition(
+            stream.handle, BASS_FILEPOS_DOWNLOAD
+        )
+        current = BASS_StreamGetFilePosition(
+            stream.handle, BASS_FILEPOS_CURRENT
+        )
+        length = stream.bytes_to_seconds(stream.get_length())
+    except BassError:
+        return False
+    if not end or downloaded >= end:
+        return False
+    return (downloaded - current) / end * length < min_buffer
+
+
 def update_ui():
     """Update user interface components."""
     global zeroed, title
@@ -66,40 +114,308 @@ def update_ui():
     app.frame.SetTitle(title)
 
 
-def play_manager():
-    """A job to check the status of playing streams and play the next one if
-    the old one has finished."""
-    global last_run, new_stream
-    now = time()
-    if now - last_run >= run_every:
-        last_run = now
-        wx.CallAfter(update_ui)
-    if new_stream is not None:
-        length, position = get_length_position(new_stream.stream)
-        if length and position and position >= length:
-            # new_stream has finished. Let's get a new track from the queue.
-            logger.info('%d/%d.', position, length)
-            if queue:
-                track = queue.pop(0)
-                play(track)
+def add_sync(playing, type, param, event):
+    """Have BASS dispatch event with playing and the sync's data as arguments
+    when a sync of the given type fires on playing.stream. Returns the sync
+    handle, or raises BassError if it could not be set."""
+
+    def callback(handle, channel, data, user):
+        events.dispatch(event, playing, data)
+
+    proc = SYNCPROC(callback)
+    handle = bass_call(
+        BASS_ChannelSetSync, playing.stream.handle, type, param, proc, None
+    )
+    playing.syncs.append((handle, proc))
+    return handle
+
+
+def watch(playing):
+    """Set the syncs which tell us when playing ends, stalls or finishes
+    downloading, and when it reaches the points where the next track should be
+    preloaded and crossfaded to."""
+    for type, event in (
+        (BASS_SYNC_END, 'end'),
+        (BASS_SYNC_STALL, 'stall'),
+        (BASS_SYNC_DOWNLOAD, 'download')
+    ):
+        try:
+            add_sync(playing, type, 0, event)
+        except BassError as e:
+            logger.exception(e)
+    arm_positions(playing)
+
+
+def arm_positions(playing):
+    """Set position syncs for the preload and crossfade points of playing,
+    replacing any which were set before. Points which have already been
+    passed are dispatched straight away. This should be called again whenever
+    the length of the stream may have changed, or after seeking."""
+    stream = playing.stream
+    for handle in playing.position_syncs:
+        BASS_ChannelRemoveSync(stream.handle, handle)
+    playing.position_syncs.clear()
+    length, position = get_length_position(stream)
+    if not length:
+        return  # We'll try again when the download event fires.
+    amount = config.sound['crossfade_amount']
+    # The next stream must have buffered before any crossfade starts.
+    points = [('preload', config.sound['preload_time'] + amount)]
+    if amount:
+        points.append(('crossfade', amount))
+    for event, seconds in points:
+        try:
+            point = max(0, length - stream.seconds_to_bytes(seconds))
+            if position >= point:
+                events.dispatch(event, playing, 0)
             else:
-                new_stream = None
+                playing.position_syncs.append(
+                    add_sync(playing, BASS_SYNC_POS, point, event)
+                )
+        except BassError as e:
+            logger.exception(e)
+
+
+def free_stream(stream):
+    """Free a stream which will not be played, logging any errors."""
+    try:
+        stream.free()
+    except BassError as e:
+        logger.warning('Unable to free %r:', stream)
+        logger.exception(e)
+
+
+def preload(track):
+    """A job to open track as next_stream. Opening a stream resolves its URL
+    and starts buffering it, so it can start instantly once the current track
+    ends."""
+    global next_stream, preloading, preload_failed
+    try:
+        logger.info('Preloading %r.', track)
+        try:
+            stream = track.get_stream()
+        except Exception as e:
+            # play will try again, and show the error then.
+            logger.warning('Failed to preload %r:', track)
+            logger.exception(e)
+            preload_failed = track
+            return True
+        if queue and queue[0] is track:
+            next_stream = Playing(track, stream)
+        else:
+            logger.info('Queue changed while preloading %r.', track)
+            free_stream(stream)
+    finally:
+        preloading = None
+    return True
+
+
+def on_preload(playing, data):
+    """Start opening the first track in the queue, and throw away next_stream
+    if the queue has changed."""
+    global next_stream, preloading
+    if playing is not new_stream:
+        return
+    if next_stream is not None and (
+        not queue or queue[0] is not next_stream.track
+    ):
+        logger.info('Discarding preloaded %r.', next_stream.track)
+        free_stream(next_stream.stream)
+        next_stream = None
+    if not queue or next_stream is not None or preloading is not None or \
+       queue[0] is preload_failed:
+        return
+    preloading = queue[0]
+    add_job(
+        'Preload %r' % preloading, partial(preload, preloading),
+        priority=priority_playback, kind='Preload'
+    )
+
+
+def on_crossfade(playing, data):
+    """Start a crossfade if the next stream is ready. If it isn't, playback
+    will carry on into it without a crossfade when playing ends."""
+    if playing is new_stream:
+        start_crossfade(playing)
+
+
+def start_crossfade(fading):
+    """Start playing next_stream silently, then have BASS ramp its volume up
+    while the volume of fading is ramped down to nothing."""
+    global old_stream, new_stream, next_stream
+    incoming = next_stream
+    if incoming is None or not queue or queue[0] is not incoming.track:
+        logger.info('Not crossfading, because the next track is not ready.')
+        return
+    amount = config.sound['crossfade_amount']
+    logger.info('Crossfading to %r over %d seconds.', incoming.track, amount)
+    queue.popleft()
+    next_stream = None
+    if old_stream is not None:
+        stop_stream(old_stream)
+    played.append(fading.track)
+    old_stream = fading
+    new_stream = incoming
+    try:
+        incoming.stream.volume = 0.0
+        incoming.stream.play()
+        incoming.stream.slide_attribute('volume', 1.0, amount)
+        fading.stream.slide_attribute('volume', 0.0, amount)
+    except BassError as e:
+        logger.warning('Crossfade failed:')
+        logger.exception(e)
+        stop_stream(fading)
+        incoming.stream.volume = 1.0
+    else:
+        add_job(
+            'Finish Crossfade', partial(finish_crossfade, fading),
+            lane='realtime', priority=priority_playback, delay=amount
+        )
+    watch(incoming)
+
+
+def finish_crossfade(fading):
+    """Stop and free fading, once it has faded out. If play has been called
+    in the meantime it will already have been stopped."""
+    if old_stream is fading:
+        stop_stream(fading)
+    return True
+
+
+def stop_stream(playing):
+    """Stop and free the stream of playing. If it is old_stream, clear
+    old_stream."""
+    global old_stream
+    if old_stream is playing:
+        old_stream = None
+    try:
+        if playing.stream.is_playing:
+            playing.stream.stop()
+    except BassError as e:
+        logger.exception(e)
+    free_stream(playing.stream)
+
+
+def on_end(playing, data):
+    """Play the next track from the queue when new_stream finishes. If it
+    wasn't preloaded, it is opened in the io lane first, because resolving a
+    stream can take a while."""
+    global new_stream, opening
+    if playing is not new_stream:
+        return  # Faded out or replaced already.
+    logger.info('Finished %r.', playing.track)
+    if not queue:
+        new_stream = None
+        return
+    track = queue.popleft()
+    if next_stream is not None and next_stream.track is track:
+        play(track)
+    else:
+        opening = track
+        add_job(
+            'Open %r' % track, partial(open_next, playing, track),
+            priority=priority_playback, kind='Open'
+        )
+
+
+def open_next(ended, track):
+    """A job to open track, then play it in the realtime lane."""
+    global opening
+    try:
+        stream = track.get_stream()
+    except Exception:
+        if opening is track:
+            opening = None
+        raise
+    add_job(
+        'Play %r' % track, partial(play_next, ended, track, stream),
+        lane='realtime', priority=priority_playback
+    )
+    return True
 
 
-add_job('Play Manager', play_manager)
+def play_next(ended, track, stream):
+    """A job to play track with stream, which open_next opened after ended
+    finished, unless something else has been played since."""
+    global opening
+    try:
+        if ended is new_stream:
+            play(track, stream=stream)
+        else:
+            logger.info('Not playing %r, because something else is.', track)
+            free_stream(stream)
+    finally:
+        if opening is track:
+            opening = None
+    return True
+
+
+def on_stall(playing, data):
+    """A stream has stalled (data is 0) or resumed (data is 1)."""
+    playing.stalled = not data
+    logger.info(
+        '%s %r.', 'Stalled' if playing.stalled else 'Resumed', playing.track
+    )
+
+
+def on_download(playing, data):
+    """The whole stream has been downloaded, so its length is now exact."""
+    logger.info('Finished downloading %r.', playing.track)
+    if playing is new_stream:
+        arm_positions(playing)
+
 
+for name, func in (
+    ('end', on_end),
+    ('stall', on_stall),
+    ('download', on_download),
+    ('preload', on_preload),
+    ('crossfade', on_crossfade)
+):
+    events.register(name, func)
 
-def play(track, mark_played=True):
+
+def ui_tick():
+    """A job to keep the position slider and window title up to date."""
+    wx.CallAfter(update_ui)
+
+
+add_job(
+    'Update UI', ui_tick, run_every=run_every, lane='realtime',
+    priority=priority_ui
+)
+
+
+def play(track, mark_played=True, stream=None):
     """Play a track. If mark_played evaluates to False the old track (if any)
-    will not be added to the played list."""
-    global new_stream
+    will not be added to the played list. If stream is not None it is played,
+    otherwise if track has already been opened by preload, that stream is used
+    rather than opening a new one."""
+    global new_stream, next_stream, opening
     logger.info('Playing %r.', track)
+    if old_stream is not None:
+        stop_stream(old_stream)  # Still fading out.
     if new_stream is not None:
         if mark_played:
             played.append(new_stream.track)
             logger.info('Played: %r.', old_stream)
         if new_stream.stream.is_playing:
             new_stream.stream.pause()
-    stream = track.get_stream()
+    preloaded, next_stream = next_stream, None
+    if stream is None and preloaded is not None and preloaded.track is track:
+        logger.info('Using preloaded stream.')
+        stream = preloaded.stream
+    else:
+        if preloaded is not None:
+            free_stream(preloaded.stream)
+        if stream is None:
+            opening = track
+            try:
+                stream = track.get_stream()
+            finally:
+                if opening is track:
+                    opening = None
+    stream.volume = 1.0
     new_stream = Playing(track, stream)
+    watch(new_stream)
     new_stream.stream.play()
@@ -0,0 +1,125 @@
+"""Provides the CachingURLStream class, and open_url_stream."""
+
+import logging
+import os
+import os.path
+from ctypes import string_at
+from functools import partial
+from sound_lib.main import BassError
+from sound_lib.stream import URLStream
+from sound_lib.external.pybass import (
+    BASS_StreamGetFilePosition, BASS_FILEPOS_START, BASS_FILEPOS_END
+)
+from .downloads import get_partial_path
+from .jobs import add_job, priority_download
+
+logger = logging.getLogger(__name__)
+
+
+def open_url_stream(backend, url, name, **kwargs):
+    """Return a stream of url, which is the file called name in the download
+    directory of backend, for a track which is not in the cache.
+
+    Usually this is a CachingURLStream. If part of the file was downloaded
+    before, the download manager is asked to resume it, and url is streamed
+    without being cached, so the partial file is not thrown away."""
+    path = backend.get_full_path(name)
+    if os.path.isfile(get_partial_path(path)):
+        logger.info('Resuming the download of %s.', path)
+        backend.submit_download(url, name)
+        return URLStream(url.encode(), **kwargs)
+    return CachingURLStream(backend, url, name, **kwargs)
+
+
+class CachingURLStream(URLStream):
+    """A URLStream which saves the bytes BASS downloads to the media cache as
+    it plays them, so each track is only fetched once. Once BASS has the whole
+    file it plays from memory, and later plays use the cached file."""
+
+    def __init__(self, backend, url, name, **kwargs):
+        """Stream url, saving it as the file called name in the download
+        directory of backend. Raises AlreadyDownloadingError if that file is
+        already being downloaded. Any partial file is overwritten, so use
+        open_url_stream rather than creating instances directly."""
+        self.backend = backend
+        self.path = backend.start_download(name)
+        self.file = open(get_partial_path(self.path), 'wb')
+        self.written = 0
+        self.finished = False  # Set when BASS has downloaded everything.
+        try:
+            super(CachingURLStream, self).__init__(
+                url.encode(), downloadproc=self.on_block, **kwargs
+            )
+        except BassError:
+            self.file.close()
+            backend.abandon_download(self.path)
+            raise
+
+    def on_block(self, buffer, length, user):
+        """Called by BASS with each block of data it downloads, then with a
+        NULL buffer when the download is complete."""
+        try:
+            if buffer:
+                self.file.write(string_at(buffer, length))
+                self.written += length
+            else:
+                self.finished = True
+                self.file.close()
+                handle = getattr(self, 'handle', None)
+                if handle is None:
+                    # Finished before URLStream.__init__ returned.
+                    valid = True
+                else:
+                    # BASS restarts the download from a later offset if we
+                    # seek past what it has, which would leave a hole in our
+                    # copy.
+                    start = BASS_StreamGetFilePosition(
+                        handle, BASS_FILEPOS_START
+                    )
+                    end = BASS_StreamGetFilePosition(handle, BASS_FILEPOS_END)
+                    valid = start == 0 and self.written == end
+                add_job(
+                    'Cache %s' % self.path, partial(self.save, valid),
+                    priority=priority_download, kind='Cache'
+                )
+        except Exception as e:
+            logger.warning('Unable to cache %s:', self.path)
+            logger.exception(e)
+
+    def save(self, valid):
+        """A job to move the downloaded file into place if it is valid, or
+        discard it otherwise."""
+        if valid:
+            logger.info('Cached %s (%d bytes).', self.path, self.written)
+            self.backend.finish_download(self.path)
+        else:
+            logger.info('Discarding incomplete copy of %s.', self.path)
+            self.discard()
+        return True
+
+    def discard(self):
+        """Remove the partial file and forget this download."""
+        partial_path = get_partial_path(self.path)
+        if os.path.isfile(partial_path):
+            os.remove(partial_path)
+        self.backend.abandon_download(self.path)
+
+    def free(self):
+        """Stop caching before the stream is freed. If the download stopped
+        part way through, what we have is kept so it can be resumed, unless
+        there is a hole in it."""
+        if not self.finished:
+            self.finished = True
+            self.file.close()
+            try:
+                start = BASS_StreamGetFilePosition(
+                    self.handle, BASS_FILEPOS_START
+                )
+            except Exception as e:
+                logger.exception(e)
+                start = None
+            if start == 0:
+                self.backend.abandon_download(self.path)
+            else:
+                self.discard()
+        return super(CachingURLStream, self).free()
@@ -0,0 +1,118 @@
+"""Provides the TrackIndex class, which filters results as the user types."""
+
+import re
+from bisect import bisect_left
+from attr import attrs, attrib, Factory
+
+prefix_length = 3  # The longest prefix with its own set of positions.
+word_re = re.compile(r'\w+')
+
+
+def tokenise(text):
+    """Return a tuple of the lower case words in text."""
+    return tuple(word_re.findall(text.lower()))
+
+
+@attrs
+class TrackIndex:
+    """An in-memory index of rows by the words of their descriptions. A row
+    matches a query if every word of the query starts one of the row's words.
+
+    Adding a row only stores it, so loading a large library is quick. The
+    words of new rows are indexed by update, which can be called a few rows at
+    a time while the user interface is idle, and which every search calls to
+    finish the job.
+
+    Every prefix of up to prefix_length characters maps to the set of
+    positions of the rows with a word starting with it, so short words are a
+    single dictionary lookup. Longer words are found in a sorted list of every
+    word in the index, and the positions of the words which start with them
+    are combined."""
+
+    rows = attrib(default=Factory(list), init=False)
+    texts = attrib(default=Factory(list), init=False)  # Row descriptions.
+    indexed = attrib(default=Factory(int), init=False)  # Rows indexed so far.
+    prefixes = attrib(default=Factory(dict), init=False)
+    words = attrib(default=Factory(dict), init=False)  # Positions by word.
+    vocabulary = attrib(default=None, init=False)  # Sorted words, or None.
+
+    def __len__(self):
+        return len(self.rows)
+
+    def clear(self):
+        """Forget all rows."""
+        self.rows.clear()
+        self.texts.clear()
+        self.indexed = 0
+        self.prefixes.clear()
+        self.words.clear()
+        self.vocabulary = None
+
+    def add(self, row, text):
+        """Add row, described by text, and return its position."""
+        self.rows.append(row)
+        self.texts.append(text)
+        return len(self.rows) - 1
+
+    def get(self, position):
+        """Return the row at position."""
+        return self.rows[position]
+
+    def update(self, limit=None):
+        """Index the words of up to limit of the rows which have been added
+        since the last time, or all of them if limit is None. Returns True if
+        every row has been indexed."""
+        end = len(self.rows)
+        if limit is not None:
+            end = min(end, self.indexed + limit)
+        for position in range(self.indexed, end):
+            for word in tokenise(self.texts[position]):
+                if word not in self.words:
+                    self.words[word] = set()
+                    self.vocabulary = None
+                self.words[word].add(position)
+                for length in range(1, min(len(word), prefix_length) + 1):
+                    self.prefixes.setdefault(
+                        word[:length], set()
+                    ).add(position)
+        self.indexed = end
+        return end == len(self.rows)
+
+    def matches(self, position, query):
+        """Return True if the row at position matches query."""
+        words = tokenise(self.texts[position])
+        return all(
+            any(w.startswith(word) for w in words)
+            for word in tokenise(query)
+        )
+
+    def get_positions(self, word):
+        """Return the set of positions of the rows with a word which starts
+        with word."""
+        if len(word) <= prefix_length:
+            return self.prefixes.get(word, set())
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.words)
+        positions = set()
+        index = bisect_left(self.vocabulary, word)
+        while index < len(self.vocabulary) and \
+                self.vocabulary[index].startswith(word):
+            positions.update(self.words[self.vocabulary[index]])
+            index += 1
+        return positions
+
+    def search(self, query):
+        """Return the positions of the rows which match query, in the order
+        they were added."""
+        words = tokenise(query)
+        if not words:
+            return list(range(len(self.rows)))
+        self.update()
+        sets = []
+        for word in set(words):
+            positions = self.get_positions(word)
+            if not positions:
+                return []
+            sets.append(positions)
+        sets.sort(key=len)
+        return sorted(sets[0].intersection(*sets[1:]))
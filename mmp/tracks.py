@@ -28,3 +28,15 @@ class Track:
     def get_stream(self):
         """Return a stream which can be played."""
         raise NotImplementedError('You must implement this method yourself.')
+
+    def get_key(self):
+        """Return a string which identifies this track among the tracks of its
+        backend, so it can be stored in the catalogue (see mmp.catalogue), or
+        None if it shouldn't be. Tracks are pickled when they are stored."""
+        return None
+
+    def get_download(self):
+        """Return a tuple of (backend, url, name), so the track can be
+        downloaded into the media cache before it is played, or None if that
+        isn't possible. This will be called from a job, so it may block."""
+        return None
@@ -4,7 +4,7 @@ import logging
 import wx
 from lyricscraper.lyrics import get_lyrics
 from .. import app, sound
-from ..jobs import add_job
+from ..jobs import add_job, priority_ui
 
 logger = logging.getLogger(__name__)
 nothing_playing = 'Nothing playing.'
@@ -80,4 +80,6 @@ def update_lyrics():
     f.load_lyrics(artist, title)
 
 
-add_job('Update Lyrics', update_lyrics, run_every=1.0)
+add_job(
+    'Update Lyrics', update_lyrics, run_every=1.0, priority=priority_ui
+)
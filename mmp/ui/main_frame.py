@@ -5,16 +5,22 @@ from threading import Thread
 from inspect import isclass
 import wx
 import six
+from sqlalchemy.orm import selectinload
 import backends
-from .. import app, sound
-from ..jobs import run_jobs
+from .. import app, sound, aio, prefetch
+from ..jobs import add_job, run_jobs, stop_jobs
 from ..backends import Backend
+from ..cache import cache
+from ..search_cache import search_cache
 from .menus.menubar import MenuBar
 from .panels.left_panel import LeftPanel
 from .panels.right_panel import RightPanel
+from .results_list import ResultsList
 from ..app import name
 from ..config import config
-from ..hotkeys import handle_hotkey, add_hotkey, functions, section_media
+from ..hotkeys import (
+    handle_hotkey, add_hotkey, register, functions, section_media
+)
 from ..db import session, Section, Hotkey, DBProxy
 
 logger = logging.getLogger(__name__)
@@ -75,19 +81,23 @@ class MainFrame(wx.Frame):
         self.jobs_thread = Thread(target=run_jobs)
         self.jobs_thread.start()
 
-    def add_section(self, section, root=None):
+    def add_section(self, section, children, root=None):
         """Add a section recursively with all its options to the provided
-        section or self.hotkeys_root."""
+        section or self.hotkeys_root. Children is a dictionary mapping section
+        ids to lists of their subsections, so the children relationship
+        doesn't need loading for every section."""
         if root is None:
             root = self.hotkeys_root
         section_item = self.tree.AppendItem(root, section.name)
         self.tree.SetItemData(section_item, DBProxy(Section, section.id))
-        if section.children or section.hotkeys:
+        subsections = children.get(section.id, [])
+        hotkeys = [h for h in section.hotkeys if h.active]
+        if subsections or hotkeys:
             self.tree.SetItemHasChildren(section_item)
         logger.info('Added %r.', section)
-        for subsection in section.children:
-            self.add_section(subsection, section_item)
-        for hotkey in section.hotkeys:
+        for subsection in subsections:
+            self.add_section(subsection, children, section_item)
+        for hotkey in hotkeys:
             doc = functions[
                 (hotkey.control_id, hotkey.func_name)
             ].__doc__
@@ -104,7 +114,7 @@ class MainFrame(wx.Frame):
         p = c.GetParent()
         if isinstance(c, wx.TextCtrl):
             func = p.on_search
-        elif isinstance(c, wx.ListBox):
+        elif isinstance(c, ResultsList):
             func = p.on_activate
         else:
             return event.Skip()
@@ -114,7 +124,7 @@ class MainFrame(wx.Frame):
         """Handle the applications key ETC."""
         c = event.EventObject
         p = c.GetParent()
-        if isinstance(c, wx.ListBox):
+        if isinstance(c, ResultsList):
             p.on_context(event)
 
     def on_show(self, event):
@@ -123,6 +133,8 @@ class MainFrame(wx.Frame):
         self.root = self.tree.AddRoot(name)
         self.backends_root = self.tree.AppendItem(self.root, 'Backends')
         self.hotkeys_root = self.tree.AppendItem(self.root, 'Hotkeys')
+        self.jobs_root = self.tree.AppendItem(self.root, 'Jobs')
+        self.downloads_root = self.tree.AppendItem(self.root, 'Downloads')
         for root in (self.root, self.backends_root, self.hotkeys_root):
             self.tree.SetItemHasChildren(root)
         self.config_root = self.add_config(self.root, config)
@@ -130,12 +142,19 @@ class MainFrame(wx.Frame):
         self.tree.ExpandAll()
         self.tree.Collapse(self.config_root)
         config.load()
+        add_job('Load Media Cache', cache.load)
+        prefetch.start()
         self.set_volume(config.sound['volume'])
+        register()
         with session() as s:
-            # Clear out inactive hotkeys.
-            s.query(Hotkey).filter_by(active=False).delete()
-            for section in s.query(Section).filter_by(parent=None):
-                self.add_section(section)
+            # Load every section and its hotkeys with two queries.
+            children = {}
+            for section in s.query(Section).options(
+                selectinload(Section.hotkeys)
+            ).order_by(Section.id):
+                children.setdefault(section.parent_id, []).append(section)
+            for section in children.get(None, []):
+                self.add_section(section, children)
         if config.interface['last_backend']:
             for b in self.backends:
                 if b.short_name == config.interface['last_backend']:
@@ -168,7 +187,9 @@ class MainFrame(wx.Frame):
         """Set app.running to false before we close."""
         if app.lyrics_frame is not None:
             app.lyrics_frame.Close(True)
-        app.running = False
+        stop_jobs()
+        aio.stop()
+        search_cache.log_stats()
         event.Skip()
 
     def on_error(self, message, title=None, style=None):
@@ -2,21 +2,37 @@
 
 import logging
 from functools import partial
+from operator import itemgetter
 import wx
 from wx.lib.sized_controls import SizedPanel
-from attr import asdict
-from ... import app, sound
+from ... import app, sound, aio
+from ...config import config
+from ...formatter import formatter
 from ...jobs import add_job
+from ...track_index import TrackIndex
+from ..results_list import ResultsList
 
 logger = logging.getLogger(__name__)
+filter_delay = 150  # Milliseconds to wait for more typing before filtering.
+index_chunk = 500  # How many results to index between events.
 
 
 class BackendPanel(SizedPanel):
-    """The default panel used by Backend instances."""
+    """The default panel used by Backend instances.
+
+    Typing in the search field filters the results which are already loaded,
+    by their artists, albums and titles. Pressing enter searches the backend,
+    unless remote_search is False, in which case it just filters straight
+    away."""
+
+    remote_search = True
 
     def __init__(self, backend, *args, **kwargs):
         """Initialise an add some controls."""
         self.backend = backend
+        self.index = TrackIndex()
+        self.filter_timer = None
+        self.indexing = False
         super(BackendPanel, self).__init__(*args, **kwargs)
         self.menu = wx.Menu()
         self.play_menu_item = self.menu.Append(
@@ -27,8 +43,9 @@ class BackendPanel(SizedPanel):
         self.SetSizerType('form')
         self.search_label = wx.StaticText(self, label='&Find')
         self.search_field = wx.TextCtrl(self)
+        self.search_field.Bind(wx.EVT_TEXT, self.on_text)
         self.results_label = wx.StaticText(self, label='&Results')
-        self.results = wx.ListBox(self)
+        self.results = ResultsList(self, self.stringify)
         self.results.Bind(wx.EVT_RIGHT_DOWN, self.on_context)
 
     def on_context(self, event):
@@ -36,11 +53,32 @@ class BackendPanel(SizedPanel):
         if self.menu is None or (
             self.get_result() is None and self.results.HitTest(
                 event.GetPosition()
-            ) == -1
+            ) == wx.NOT_FOUND
         ):
             return wx.Bell()
         self.results.PopupMenu(self.menu)
 
+    def on_text(self, event):
+        """The search field has changed, so filter the results once the user
+        stops typing."""
+        event.Skip()
+        if self.filter_timer is not None:
+            self.filter_timer.Stop()
+        self.filter_timer = wx.CallLater(filter_delay, self.apply_filter)
+
+    def apply_filter(self):
+        """Show only the loaded results which match the search field."""
+        if self.filter_timer is not None:
+            self.filter_timer.Stop()
+            self.filter_timer = None
+        positions = self.index.search(self.search_field.GetValue())
+        self.results.Set([self.index.get(p) for p in positions])
+
+    def clear_results(self):
+        """Remove every result, including those hidden by the filter."""
+        self.index.clear()
+        self.results.Clear()
+
     def do_search(self, text, backend=None):
         """This method will be called as a job to gather the results from
         the on_search hook of the provided backend (or self.backend) and pass
@@ -49,65 +87,95 @@ class BackendPanel(SizedPanel):
             backend = self.backend
         logger.debug('Searching %r for %s.', backend, text)
         results = backend.on_search(text)
+        wx.CallAfter(self.finalise_search, text, results, backend=backend)
+        return True
 
-        def finalise_search():
-            """Add the results and clear the text field."""
+    def finalise_search(self, text, results, backend=None):
+        """Add the results and clear the text field."""
+        if backend is None:
+            backend = self.backend
+        if results:
             self.search_field.Clear()
             self.add_results(results, backend=backend)
-
-        if results:
-            wx.CallAfter(finalise_search)
         else:
-            wx.CallAfter(
-                backend.frame.on_error, 'No results found for %s.' % text
-            )
-        return True
+            backend.frame.on_error('No results found for %s.' % text)
 
     def on_search(self, event):
         """The enter key was pressed in the search field."""
+        if not self.remote_search:
+            self.apply_filter()
+            if self.results.Count:
+                self.results.SetFocus()
+                self.results.SetSelection(0)
+            return
         text = self.search_field.GetValue()
-        add_job(
-            'Add results from %s' % self.backend.name,
-            partial(self.do_search, text)
-        )
+        if aio.is_async(self.backend.on_search):
+            aio.submit(
+                self.backend.on_search(text),
+                callback=partial(self.finalise_search, text)
+            )
+        else:
+            add_job(
+                'Add results from %s' % self.backend.name,
+                partial(self.do_search, text), lane='search',
+                key=('search', id(self))
+            )
 
     def stringify(self, track, backend=None):
         """Return a user-friendly string representation of track."""
         if backend is None:
             backend = self.backend
-        try:
-            return app.track_format_template.render(
-                **asdict(track), backend=backend
-            )
-        except Exception as e:
-            return str(e)
+        return formatter.format(track, backend)
+
+    def get_search_text(self, track):
+        """Return the text which the search field filters track by."""
+        return ' '.join(
+            str(value) for value in (track.artist, track.album, track.title)
+            if value is not None
+        )
 
     def add_result(self, track, backend=None):
         """Adds a Track instance to self.results."""
+        self.extend_results([track], backend=backend)
+
+    def extend_results(self, results, clear=False, backend=None):
+        """Add a list of tracks to self.index, and show those which match the
+        search field. If these are the first results, select the first one.
+        Nothing is formatted until it is drawn, so this is quick however many
+        tracks there are."""
         if backend is None:
             backend = self.backend
-        res = self.results.Append(self.stringify(track, backend=backend))
-        track.index = res
-        self.results.SetClientData(res, track)
-        if not res:
+        if clear:
+            self.clear_results()
+        query = self.search_field.GetValue()
+        rows = []
+        for track in results:
+            row = (track, backend)
+            position = self.index.add(row, self.get_search_text(track))
+            if not query or self.index.matches(position, query):
+                rows.append(row)
+        if rows and not self.results.Extend(rows):
             if isinstance(self.FindFocus(), wx.TextCtrl):
                 self.results.SetFocus()
             self.results.SetSelection(0)
-        return res
+        if not self.indexing:
+            self.indexing = True
+            wx.CallAfter(self.index_results)
+
+    def index_results(self):
+        """Index a few more results, then let the user interface catch up
+        before doing the next few, so filtering is quick from the start."""
+        if self.index.update(limit=index_chunk):
+            self.indexing = False
+        else:
+            wx.CallAfter(self.index_results)
 
     def add_results(self, results, clear=True, backend=None):
-        """Add multiple results to self.results."""
-        if clear:
-            self.results.Clear()
-
-        def f():
-            """Add a result."""
-            if not results:
-                return True
-            result = results.pop(0)
-            wx.CallAfter(self.add_result, result, backend=backend)
-
-        add_job('Add Results', f)
+        """Add multiple results to self.results. This can be called from any
+        thread."""
+        wx.CallAfter(
+            self.extend_results, list(results), clear=clear, backend=backend
+        )
 
     def get_result(self):
         """Get and return the currently-selected result."""
@@ -117,6 +185,10 @@ class BackendPanel(SizedPanel):
 
     def on_activate(self, event):
         """An entry in self.results has been clicked."""
+        # Tracks can be shown by more than one panel (the search cache hands
+        # out the same tracks again), so track.index may be the row in another
+        # panel.
+        selection = self.results.GetSelection()
         res = self.get_result()
         if res is not None:
             try:
@@ -130,9 +202,12 @@ class BackendPanel(SizedPanel):
                     logger.warning('Failed to play track: %r.', res)
                     logger.exception(e)
                     return app.frame.on_error('Failed to play track: %s' % e)
-            sound.queue.clear()
-            for index in range(res.index + 1, self.results.Count):
-                sound.queue.append(self.results.GetClientData(index))
-                logger.info('Queued %r.', sound.queue[-1])
+            # The queue refers to the rows rather than copying them.
+            sound.queue.play_from(
+                self.results.rows, selection + 1, get=itemgetter(0)
+            )
+            if config.sound['shuffle']:
+                sound.queue.shuffle()
+            logger.info('Queued %d tracks.', len(sound.queue))
         else:
             wx.Bell()
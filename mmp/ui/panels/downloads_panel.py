@@ -0,0 +1,44 @@
+"""Provides the DownloadsPanel class."""
+
+import os.path
+from .report_panel import ReportPanel
+from ...downloads import manager
+
+megabyte = 1024 * 1024
+
+
+def format_download(download):
+    """Return a line describing download."""
+    name = os.path.basename(download.path)
+    if not download.active:
+        return '%s from %s: queued.' % (name, download.host)
+    if download.total:
+        size = '%.1f of %.1f MB (%d%%)' % (
+            download.position / megabyte, download.total / megabyte,
+            download.position * 100 / download.total
+        )
+    else:
+        size = '%.1f MB' % (download.position / megabyte)
+    details = [size]
+    rate = download.rate
+    if rate is not None:
+        details.append('%.1f KB/s' % (rate / 1024))
+    eta = download.eta
+    if eta is not None:
+        details.append('%d:%02d remaining' % divmod(int(eta), 60))
+    return '%s from %s: %s.' % (name, download.host, ', '.join(details))
+
+
+def get_lines():
+    """Return a line for every download, in the order they were submitted."""
+    return [format_download(d) for d in manager.get_downloads()]
+
+
+class DownloadsPanel(ReportPanel):
+    """Shows the downloads which are running or waiting to run."""
+
+    def __init__(self, parent, *args, **kwargs):
+        super(DownloadsPanel, self).__init__(
+            parent, '&Downloads', get_lines, 'Nothing is downloading.', *args,
+            **kwargs
+        )
@@ -4,8 +4,9 @@ import logging
 from functools import partial
 import wx
 from .backend_panel import BackendPanel
-from ...jobs import add_job
-from ... import app
+from ...catalogue import catalogue
+from ...jobs import add_job, priority_ui
+from ... import app, aio
 
 logger = logging.getLogger(__name__)
 
@@ -14,29 +15,134 @@ class GlobalBackendPanel(BackendPanel):
     def __init__(self, *args, **kwargs):
         super(GlobalBackendPanel, self).__init__(None, *args, **kwargs)
         self.search_label.SetLabel('&Global Search')
+        self.search_id = 0  # Incremented by every search.
+        # The jobs and futures of backends which have not finished searching
+        # yet, keyed by short name.
+        self.pending = {}
+        # (backend short name, key) pairs of the tracks in the results, so
+        # tracks found in the catalogue are not shown twice.
+        self.shown = set()
 
-    def do_search(self, text, backend=None):
+    def do_search(self, text, backend=None, search_id=None):
         """This method will be called as a job to gather the results from
         the on_search hook of the provided backend (or self.backend) and pass
-        them to self.add_results."""
+        them to self.add_found."""
         if backend is None:
             backend = self.backend
         logger.debug('Searching %r for %s.', backend, text)
-        results = backend.on_search(text)
+        try:
+            results = backend.on_search(text)
+        except Exception as e:
+            logger.exception(e)
+            wx.CallAfter(self.on_search_error, backend, search_id, e)
+        else:
+            wx.CallAfter(self.add_found, backend, results, search_id=search_id)
+        return True
+
+    def search_catalogue(self, text, search_id):
+        """A job to search the catalogue, which doesn't need the network."""
+        results = catalogue.search(text)
+        wx.CallAfter(self.add_catalogued, results, search_id)
+        return True
+
+    def add_catalogued(self, results, search_id):
+        """Add the (short name, track) pairs found in the catalogue, unless
+        another search has started. Tracks from backends which are not loaded
+        are skipped."""
+        if search_id != self.search_id:
+            return
+        backends = {}
+        for backend in app.frame.backends:
+            backends.setdefault(backend.short_name, backend)
+        for name, track in results:
+            backend = backends.get(name)
+            if backend is not None and self.is_new(backend, track):
+                self.add_result(track, backend=backend)
+
+    def is_new(self, backend, track):
+        """Return True if track from backend is not in the results yet, and
+        remember that it is now."""
+        key = track.get_key()
+        if key is None:
+            return True
+        key = (backend.short_name, key)
+        if key in self.shown:
+            return False
+        self.shown.add(key)
+        return True
+
+    def is_pending(self, backend, search_id):
+        """Return True if search_id is the current search and backend has not
+        finished it or run out of time, then mark it finished."""
+        if search_id is not None and search_id != self.search_id:
+            return False  # A newer search has started.
+        return self.pending.pop(backend.short_name, None) is not None
+
+    def add_found(self, backend, results, search_id=None):
+        """Add the results found by backend, unless they are too late."""
+        if not self.is_pending(backend, search_id):
+            return logger.debug('Ignoring late results from %r.', backend)
+        results = [r for r in results or [] if self.is_new(backend, r)]
         if results:
-            wx.CallAfter(
-                self.add_results, results, clear=False, backend=backend
+            self.add_results(results, clear=False, backend=backend)
+
+    def on_search_error(self, backend, search_id, error):
+        """Searching backend failed."""
+        if self.is_pending(backend, search_id):
+            app.frame.on_error(
+                'Error searching %s: %s' % (backend.name, error)
             )
-        return True
+
+    def on_timeout(self, backend, search_id):
+        """Give up on backend if it is still searching."""
+        task = self.pending.get(backend.short_name)
+        if task is not None and self.is_pending(backend, search_id):
+            logger.warning('Searching %r timed out.', backend)
+            task.cancel()
+
+    def cancel_search(self):
+        """Stop waiting for the results of the last search."""
+        for task in self.pending.values():
+            task.cancel()
+        self.pending.clear()
 
     def on_search(self, event):
-        """Search all backends."""
-        self.results.Clear()
+        """Search the catalogue, then all backends at once, adding the results
+        of each as they arrive. Any search which is still running is
+        cancelled."""
+        self.cancel_search()
+        self.search_id += 1
+        self.clear_results()
+        self.shown.clear()
         text = self.search_field.GetValue()
         self.search_field.Clear()
         logger.debug('Search: %s.', text)
+        add_job(
+            'Search Catalogue',
+            partial(self.search_catalogue, text, self.search_id),
+            priority=priority_ui, key='search catalogue'
+        )
         for backend in app.frame.backends:
-            add_job(
-                'Add results from %s' % backend.name,
-                partial(self.do_search, text, backend=backend)
+            if aio.is_async(backend.on_search):
+                task = aio.submit(
+                    backend.on_search(text),
+                    callback=partial(
+                        self.add_found, backend, search_id=self.search_id
+                    ), errback=partial(
+                        self.on_search_error, backend, self.search_id
+                    )
+                )
+            else:
+                task = add_job(
+                    'Add results from %s' % backend.name,
+                    partial(
+                        self.do_search, text, backend=backend,
+                        search_id=self.search_id
+                    ), lane='search', priority=priority_ui,
+                    key=('global search', backend.short_name)
+                )
+            self.pending[backend.short_name] = task
+            wx.CallLater(
+                int(backend.get_search_timeout() * 1000), self.on_timeout,
+                backend, self.search_id
             )
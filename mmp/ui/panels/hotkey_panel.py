@@ -3,6 +3,7 @@
 import wx
 from wx.lib.sized_controls import SizedPanel
 from ...db import session, Hotkey
+from ...hotkeys import compile_keymap
 
 keys = {getattr(wx, x): x[4:] for x in dir(wx) if x.startswith('WXK_')}
 modifiers = {getattr(wx, x): x[6:] for x in dir(wx) if x.startswith('ACCEL_')}
@@ -79,6 +80,7 @@ class HotkeyPanel(SizedPanel):
                 h.key = key
                 h.modifiers = modifiers
             s.add(h)
+        compile_keymap()
 
     def restore_default(self, event):
         """Restore the default value."""
@@ -0,0 +1,34 @@
+"""Provides the JobsPanel class."""
+
+from .report_panel import ReportPanel
+from ...jobs import get_stats
+
+stats_format = '%s: %d %s, %d %s, %d %s. Time: %.2f ms average, %.2f ms ' \
+    'max. Lag: %.2f ms average, %.2f ms max.'
+
+
+def format_stats(stat):
+    """Return a line describing stat, a JobStats instance."""
+    return stats_format % (
+        stat.name, stat.runs, 'run' if stat.runs == 1 else 'runs',
+        stat.overruns, 'overrun' if stat.overruns == 1 else 'overruns',
+        stat.errors, 'error' if stat.errors == 1 else 'errors',
+        stat.average_time * 1000, stat.max_time * 1000,
+        stat.average_lag * 1000, stat.max_lag * 1000
+    )
+
+
+def get_lines():
+    """Return a line for every kind of job which has run, the slowest
+    first."""
+    return [format_stats(stat) for stat in get_stats()]
+
+
+class JobsPanel(ReportPanel):
+    """Shows runtime statistics for the jobs framework."""
+
+    def __init__(self, parent, *args, **kwargs):
+        super(JobsPanel, self).__init__(
+            parent, '&Jobs', get_lines, 'No jobs have run yet.', *args,
+            **kwargs
+        )
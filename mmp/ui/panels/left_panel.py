@@ -7,6 +7,8 @@ from simpleconf.dialogs.wx import SimpleConfWxPanel
 from .hotkey_panel import HotkeyPanel
 from .right_panel import RightPanel
 from .global_backend_panel import GlobalBackendPanel
+from .jobs_panel import JobsPanel
+from .downloads_panel import DownloadsPanel
 from ...backends import Backend
 from ...config import config
 from ... import sound, app
@@ -22,6 +24,8 @@ class LeftPanel(wx.Panel):
         """Add controls."""
         super(LeftPanel, self).__init__(*args, **kwargs)
         self.global_backend_panel = None
+        self.jobs_panel = None
+        self.downloads_panel = None
         s = wx.BoxSizer(wx.VERTICAL)  # Main sizer.
         self.tree = wx.TreeCtrl(self)
         self.tree.Bind(wx.EVT_TREE_SEL_CHANGED, self.on_tree_change)
@@ -75,7 +79,7 @@ class LeftPanel(wx.Panel):
         else:
             return wx.Bell()
         if sound.new_stream is not None:
-            sound.queue.insert(0, sound.new_stream.track)
+            sound.queue.appendleft(sound.new_stream.track)
         sound.play(track, mark_played=False)
 
     def on_play_pause(self, event):
@@ -96,7 +100,7 @@ class LeftPanel(wx.Panel):
         if isinstance(self.FindFocus(), wx.TextCtrl):
             return event.Skip()
         if sound.queue:
-            track = sound.queue.pop(0)
+            track = sound.queue.popleft()
         else:
             return wx.Bell()
         sound.play(track)
@@ -123,6 +127,14 @@ class LeftPanel(wx.Panel):
                 self.global_backend_panel = GlobalBackendPanel(splitter)
                 logger.debug('Created %r.', self.global_backend_panel)
             new = self.global_backend_panel
+        elif item == app.frame.jobs_root:
+            if self.jobs_panel is None:
+                self.jobs_panel = JobsPanel(splitter)
+            new = self.jobs_panel
+        elif item == app.frame.downloads_root:
+            if self.downloads_panel is None:
+                self.downloads_panel = DownloadsPanel(splitter)
+            new = self.downloads_panel
         elif isinstance(data, DBProxy) and data.cls is Hotkey:
             if data.panel is None:
                 data.panel = HotkeyPanel(data, splitter)
@@ -163,6 +175,8 @@ class LeftPanel(wx.Panel):
             value = 0
         else:
             stream.position = actual_value
+            # Seeking can jump over the preload and crossfade points.
+            sound.arm_positions(sound.new_stream)
         logger.info('Setting position slider to %d.', value)
         self.position.SetValue(value)
 
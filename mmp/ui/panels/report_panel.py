@@ -0,0 +1,32 @@
+"""Provides the ReportPanel class."""
+
+import wx
+
+
+class ReportPanel(wx.Panel):
+    """A read-only report, which is brought up to date whenever it is shown or
+    its refresh button is pressed."""
+
+    def __init__(self, parent, label, get_lines, empty, *args, **kwargs):
+        """Add controls. get_lines will be called with no arguments to get
+        the lines of the report. If it returns none, empty is shown
+        instead."""
+        super(ReportPanel, self).__init__(parent, *args, **kwargs)
+        self.get_lines = get_lines
+        self.empty = empty
+        s = wx.BoxSizer(wx.VERTICAL)
+        s.Add(wx.StaticText(self, label=label), 0, wx.GROW)
+        self.info = wx.TextCtrl(self, style=wx.TE_READONLY | wx.TE_MULTILINE)
+        s.Add(self.info, 1, wx.GROW)
+        self.refresh = wx.Button(self, label='&Refresh')
+        self.refresh.Bind(wx.EVT_BUTTON, self.on_show)
+        s.Add(self.refresh, 0, wx.GROW)
+        self.SetSizerAndFit(s)
+        self.Bind(wx.EVT_SHOW, self.on_show)
+        self.on_show(None)
+
+    def on_show(self, event=None):
+        """Populate self.info."""
+        if event is not None:
+            event.Skip()
+        self.info.SetValue('\n'.join(self.get_lines()) or self.empty)
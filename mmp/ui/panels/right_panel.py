@@ -4,6 +4,7 @@ import webbrowser
 from sys import version
 import wx
 from ... import app
+from ...templates import environment
 
 info_format = """{{ app.name }} V{{ app.version }}
 {{ app.description }}
@@ -45,7 +46,7 @@ class RightPanel(wx.Panel):
         """Show the panel and populate self.info."""
         if event is not None:
             event.Skip()
-        template = app.environment.from_string(info_format)
+        template = environment.from_string(info_format)
         try:
             value = template.render(
                 app=app, python_version=version,
@@ -0,0 +1,76 @@
+"""Provides the ResultsList class."""
+
+import wx
+
+
+class ResultsList(wx.ListCtrl):
+    """A virtual list of tracks. Rows are only formatted when they are drawn,
+    so any number of tracks can be shown at once.
+
+    It has the parts of the wx.ListBox interface which the backend panels use,
+    with the tracks standing in for client data."""
+
+    def __init__(self, parent, format, *args, **kwargs):
+        """format will be called with a track and its backend to get the text
+        of a row."""
+        kwargs.setdefault(
+            'style',
+            wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_SINGLE_SEL | wx.LC_NO_HEADER
+        )
+        super(ResultsList, self).__init__(parent, *args, **kwargs)
+        self.format = format
+        self.rows = []  # (track, backend) pairs.
+        self.InsertColumn(0, 'Results')
+        self.Bind(wx.EVT_SIZE, self.on_size)
+
+    def on_size(self, event):
+        """Make the column as wide as the list."""
+        event.Skip()
+        self.SetColumnWidth(0, self.GetClientSize().width)
+
+    def OnGetItemText(self, item, column):
+        """Format a row which is about to be drawn."""
+        track, backend = self.rows[item]
+        return self.format(track, backend)
+
+    @property
+    def Count(self):
+        return len(self.rows)
+
+    def Set(self, rows):
+        """Replace every row with rows, a list of (track, backend) pairs."""
+        self.rows = []
+        self.Extend(rows)
+        self.Refresh()
+
+    def Extend(self, rows):
+        """Add rows, a list of (track, backend) pairs, and return the index of
+        the first of them."""
+        start = len(self.rows)
+        for index, (track, backend) in enumerate(rows, start):
+            track.index = index
+        self.rows.extend(rows)
+        self.SetItemCount(len(self.rows))
+        return start
+
+    def Clear(self):
+        """Remove every row."""
+        self.Set([])
+
+    def GetClientData(self, index):
+        """Return the track at index."""
+        return self.rows[index][0]
+
+    def GetSelection(self):
+        """Return the index of the selected row, or wx.NOT_FOUND."""
+        return self.GetFirstSelected()
+
+    def SetSelection(self, index):
+        """Select and focus the row at index."""
+        self.Select(index)
+        self.Focus(index)
+
+    def HitTest(self, point):
+        """Return the index of the row at point, or wx.NOT_FOUND."""
+        item, flags = super(ResultsList, self).HitTest(point)
+        return item
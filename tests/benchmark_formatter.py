@@ -0,0 +1,60 @@
+"""Compare formatting results the way they used to be formatted, with
+attr.asdict and a template rendered on every draw, with mmp.formatter.
+
+Run with python -m tests.benchmark_formatter. Nothing is asserted, because
+timings depend on the machine."""
+
+from datetime import timedelta
+from time import perf_counter
+from attr import asdict
+from mmp.config import config
+from mmp.formatter import TrackFormatter
+from mmp.templates import environment
+from .test_formatter import FakeTrack, backend
+
+track_count = 5000
+visible_rows = 30  # Drawn again and again as the list is scrolled.
+redraws = 100
+
+
+def time_per_call(func, tracks):
+    """Return the average number of microseconds func takes per track."""
+    started = perf_counter()
+    for track in tracks:
+        func(track)
+    return (perf_counter() - started) / len(tracks) * 1000000
+
+
+def main():
+    source = config.interface['track_format']
+    template = environment.from_string(source)
+    formatter = TrackFormatter()
+    formatter.set_format(source)
+    tracks = [
+        FakeTrack(
+            'Artist %d' % i, 'Album', i % 12, 'Title %d' % i,
+            duration=timedelta(seconds=200)
+        ) for i in range(track_count)
+    ]
+    visible = tracks[:visible_rows] * redraws
+
+    def before(track):
+        return template.render(**asdict(track), backend=backend)
+
+    def after(track):
+        return formatter.format(track, backend)
+
+    print(
+        'First draw: %.1f us per track before, %.1f us after.' % (
+            time_per_call(before, tracks), time_per_call(after, tracks)
+        )
+    )
+    print(
+        'Redraw: %.1f us per track before, %.1f us after.' % (
+            time_per_call(before, visible), time_per_call(after, visible)
+        )
+    )
+
+
+if __name__ == '__main__':
+    main()
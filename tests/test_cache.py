@@ -0,0 +1,37 @@
+"""Tests for mmp.cache."""
+
+import io
+import pytest
+
+pytest.importorskip('wx')
+pytest.importorskip('sound_lib')
+
+from sound_lib.stream import FileStream  # noqa: E402
+from mmp import cache, sound  # noqa: E402
+from mmp.streams import CachingURLStream  # noqa: E402
+
+
+def make_stream(cls, file):
+    """Return an instance of cls which has not opened anything."""
+    stream = cls.__new__(cls)
+    stream.file = file
+    return stream
+
+
+def test_get_open_paths(monkeypatch):
+    playing = sound.Playing(None, make_stream(FileStream, 'playing.mp3'))
+    caching = sound.Playing(
+        None, make_stream(CachingURLStream, io.BytesIO())
+    )
+    monkeypatch.setattr(sound, 'old_stream', caching)
+    monkeypatch.setattr(sound, 'new_stream', playing)
+    monkeypatch.setattr(sound, 'next_stream', None)
+    assert cache.get_open_paths() == {'playing.mp3'}
+
+
+def test_get_open_paths_bytes(monkeypatch):
+    playing = sound.Playing(None, make_stream(FileStream, b'playing.mp3'))
+    monkeypatch.setattr(sound, 'old_stream', None)
+    monkeypatch.setattr(sound, 'new_stream', None)
+    monkeypatch.setattr(sound, 'next_stream', playing)
+    assert cache.get_open_paths() == {'playing.mp3'}
@@ -0,0 +1,87 @@
+"""Tests for mmp.formatter. See benchmark_formatter.py for its speed."""
+
+from datetime import timedelta
+import pytest
+from attr import attrs, attrib, Factory
+from mmp import formatter as formatter_module
+from mmp.formatter import TrackFormatter
+from mmp.tracks import Track
+
+track_format = (
+    '{{ artist }} - {{ title }}'
+    '{% if duration %} ({{ duration | format_timedelta }}){% endif %}'
+    ' *{{ backend.name }}*'
+)
+
+
+@attrs
+class FakeTrack(Track):
+    duration = attrib(default=Factory(timedelta))
+
+
+class FakeBackend:
+    name = 'Fake Backend'
+
+
+backend = FakeBackend()
+
+
+@pytest.fixture
+def formatter():
+    formatter = TrackFormatter()
+    formatter.set_format(track_format)
+    return formatter
+
+
+@pytest.fixture
+def track():
+    return FakeTrack(
+        'Artist', 'Album', 1, 'Title', duration=timedelta(seconds=60)
+    )
+
+
+def test_format(formatter, track):
+    assert formatter.format(track, backend) == (
+        'Artist - Title (1 minute) *Fake Backend*'
+    )
+
+
+def test_remembers(formatter, track):
+    string = formatter.format(track, backend)
+    track.title = 'Changed'
+    assert formatter.format(track, backend) is string
+
+
+def test_forget(formatter, track):
+    formatter.format(track, backend)
+    other = FakeTrack('Other', None, None, 'Track')
+    other_string = formatter.format(other, backend)
+    track.title = 'Changed'
+    formatter.forget(track)
+    assert formatter.format(track, backend).startswith('Artist - Changed ')
+    assert formatter.format(other, backend) is other_string
+
+
+def test_set_format(formatter, track):
+    formatter.format(track, backend)
+    formatter.set_format(track_format)
+    assert len(formatter.strings) == 1
+    formatter.set_format('{{ title }}')
+    assert not formatter.strings
+    assert formatter.format(track, backend) == 'Title'
+
+
+def test_render_error(formatter, track):
+    formatter.set_format('{{ title.missing() }}')
+    assert formatter.format(track, backend) == 'Artist - Album - Title'
+
+
+def test_max_strings(formatter, monkeypatch):
+    monkeypatch.setattr(formatter_module, 'max_strings', 2)
+    tracks = [FakeTrack(None, None, None, str(i)) for i in range(3)]
+    for t in tracks:
+        formatter.format(t, backend)
+    formatter.format(tracks[1], backend)  # Now the most recently used.
+    assert [key[0] for key in formatter.strings] == [
+        id(tracks[2]), id(tracks[1])
+    ]
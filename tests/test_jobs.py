@@ -0,0 +1,102 @@
+"""Tests for mmp.jobs. Jobs are run with run_job rather than by the jobs
+thread."""
+
+import pytest
+
+pytest.importorskip('wx')
+
+from mmp import jobs  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def empty(monkeypatch):
+    """Give every test its own heap, keys and stats."""
+    monkeypatch.setattr(jobs, 'jobs', [])
+    monkeypatch.setattr(jobs, 'keys', {})
+    monkeypatch.setattr(jobs, 'stats', {})
+
+
+def done():
+    return True
+
+
+def scheduled():
+    """Return the jobs which are waiting to run."""
+    return [job for next_run, sequence, job in jobs.jobs]
+
+
+def test_add_job():
+    job = jobs.add_job('Test', done, delay=10)
+    assert scheduled() == [job]
+    assert job.lane == 'io'
+    assert job.priority == jobs.priority_normal
+
+
+def test_invalid_lane():
+    with pytest.raises(ValueError):
+        jobs.add_job('Test', done, lane='nowhere')
+
+
+def test_key():
+    first = jobs.add_job('First', done, key='test')
+    second = jobs.add_job(
+        'Second', print, key='test', priority=jobs.priority_ui, kind='Tests'
+    )
+    assert second is first
+    assert scheduled() == [first]
+    assert first.name == 'Second'
+    assert first.func is print
+    assert first.priority == jobs.priority_ui
+    assert first.get_kind() == 'Tests'
+    # Merging never lowers the priority.
+    jobs.add_job('Third', done, key='test', priority=jobs.priority_download)
+    assert first.priority == jobs.priority_ui
+
+
+def test_key_after_run():
+    first = jobs.add_job('First', done, key='test')
+    jobs.run_job(first)
+    second = jobs.add_job('Second', done, key='test')
+    assert second is not first
+
+
+def test_cancel():
+    first = jobs.add_job('First', done, key='test')
+    first.cancel()
+    assert first.cancelled
+    second = jobs.add_job('Second', done, key='test')
+    assert second is not first
+    assert not second.cancelled
+
+
+def test_reschedule():
+    runs = []
+
+    def func():
+        runs.append(len(runs))
+
+    job = jobs.add_job('Repeat', func, run_every=60)
+    jobs.jobs.clear()
+    jobs.run_job(job)
+    assert runs == [0]
+    assert scheduled() == [job]
+    assert job.next_run >= job.last_run + 60
+
+
+def test_cancel_while_running():
+    def func():
+        job.cancel()
+
+    job = jobs.add_job('Cancel', func, run_every=60)
+    jobs.jobs.clear()
+    jobs.run_job(job)
+    assert scheduled() == []
+
+
+def test_stats():
+    for i in range(3):
+        jobs.run_job(jobs.add_job('Job %d' % i, done, kind='Tests'))
+    jobs.run_job(jobs.add_job('Other', done))
+    assert set(jobs.stats) == {'Tests', 'Other'}
+    assert jobs.stats['Tests'].runs == 3
+    assert jobs.stats['Other'].runs == 1
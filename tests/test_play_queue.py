@@ -0,0 +1,104 @@
+"""Tests for mmp.play_queue."""
+
+from operator import itemgetter
+import pytest
+from mmp.play_queue import Permutation, PlayQueue
+
+
+@pytest.mark.parametrize('size', list(range(1, 70)) + [255, 256, 257, 5000])
+def test_permutation(size):
+    permutation = Permutation(size)
+    assert sorted(permutation[i] for i in range(size)) == list(range(size))
+
+
+def test_permutation_index_error():
+    permutation = Permutation(5)
+    with pytest.raises(IndexError):
+        permutation[5]
+    with pytest.raises(IndexError):
+        permutation[-1]
+
+
+@pytest.fixture
+def queue():
+    """A queue of rows 2 to 7 of a list, with tracks at either end."""
+    queue = PlayQueue()
+    queue.play_from(list(range(10)), 2, 8)
+    queue.appendleft('a')
+    queue.appendleft('b')
+    queue.append('y')
+    queue.append('z')
+    return queue
+
+
+def test_play_queue(queue):
+    assert len(queue) == 10
+    assert list(queue) == ['b', 'a', 2, 3, 4, 5, 6, 7, 'y', 'z']
+
+
+def test_getitem(queue):
+    assert queue[0] == 'b'
+    assert queue[2] == 2
+    assert queue[8] == 'y'
+    assert queue[-1] == 'z'
+    assert queue[-10] == 'b'
+    with pytest.raises(IndexError):
+        queue[10]
+    with pytest.raises(IndexError):
+        queue[-11]
+
+
+def test_slices(queue):
+    assert queue[1:4] == ['a', 2, 3]
+    assert queue[6:] == [6, 7, 'y', 'z']
+    assert queue[::3] == ['b', 3, 6, 'z']
+    assert queue[-3:] == [7, 'y', 'z']
+
+
+def test_popleft(queue):
+    popped = [queue.popleft() for _ in range(len(queue))]
+    assert popped == ['b', 'a', 2, 3, 4, 5, 6, 7, 'y', 'z']
+    assert not queue
+    with pytest.raises(IndexError):
+        queue.popleft()
+
+
+def test_appendleft_after_popleft(queue):
+    for _ in range(4):
+        queue.popleft()
+    queue.appendleft(3)
+    assert list(queue) == [3, 4, 5, 6, 7, 'y', 'z']
+
+
+def test_get():
+    queue = PlayQueue()
+    rows = [('track %d' % i, 'backend') for i in range(5)]
+    queue.play_from(rows, 1, get=itemgetter(0))
+    assert list(queue) == ['track 1', 'track 2', 'track 3', 'track 4']
+
+
+def test_clear(queue):
+    queue.clear()
+    assert len(queue) == 0
+    assert list(queue) == []
+
+
+def test_shuffle(queue):
+    queue.popleft()
+    queue.popleft()
+    queue.popleft()
+    queue.shuffle()
+    items = list(queue)
+    assert len(queue) == 7
+    assert sorted(items[:5]) == [3, 4, 5, 6, 7]
+    assert items[5:] == ['y', 'z']
+    assert [queue[i] for i in range(len(queue))] == items
+    queue.appendleft('a')
+    assert [queue.popleft() for _ in range(len(queue))] == ['a'] + items
+
+
+def test_shuffle_twice(queue):
+    queue.shuffle()
+    items = list(queue)
+    queue.shuffle()
+    assert list(queue) == items
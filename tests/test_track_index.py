@@ -0,0 +1,76 @@
+"""Tests for mmp.track_index."""
+
+import random
+import pytest
+from mmp.track_index import TrackIndex, tokenise
+
+words = [
+    'rock', 'rocket', 'roll', 'rolling', 'stone', 'stones', 'a', 'an', 'the',
+    'beyoncé', 'café', 'live', 'love', 'lovely', '1999', 'x'
+]
+
+
+def make_text(rng):
+    return ' '.join(rng.choice(words) for _ in range(rng.randint(0, 6)))
+
+
+def make_queries(rng):
+    queries = ['', '   ', 'zzz', 'ROCK', 'Café', 'rock-and-roll', 'lov ro']
+    for _ in range(200):
+        queries.append(
+            ' '.join(
+                rng.choice(words)[:rng.randint(1, 8)]
+                for _ in range(rng.randint(1, 3))
+            )
+        )
+    return queries
+
+
+def brute_force(index, query):
+    return [p for p in range(len(index)) if index.matches(p, query)]
+
+
+def test_tokenise():
+    assert tokenise('Rock & Roll - Café 1999') == (
+        'rock', 'roll', 'café', '1999'
+    )
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_search(seed):
+    rng = random.Random(seed)
+    index = TrackIndex()
+    for row in range(500):
+        index.add(row, make_text(rng))
+    for query in make_queries(rng):
+        assert index.search(query) == brute_force(index, query), query
+
+
+def test_update():
+    rng = random.Random(3)
+    index = TrackIndex()
+    queries = make_queries(rng)
+    for row in range(300):
+        index.add(row, make_text(rng))
+        if row % 50 == 0:
+            index.update(limit=20)
+        if row % 70 == 0:
+            # Searching indexes everything, then more rows are added.
+            for query in queries[:20]:
+                assert index.search(query) == brute_force(index, query)
+    while not index.update(limit=7):
+        assert index.indexed < len(index)
+    assert index.indexed == len(index)
+    for query in queries:
+        assert index.search(query) == brute_force(index, query), query
+
+
+def test_get_and_clear():
+    index = TrackIndex()
+    assert index.add('first', 'one') == 0
+    assert index.add('second', 'two') == 1
+    assert index.get(1) == 'second'
+    assert index.search('tw') == [1]
+    index.clear()
+    assert len(index) == 0
+    assert index.search('tw') == []